@@ -1,28 +1,72 @@
 import argparse
+import multiprocessing
 import os
 import shutil
+import time
 
 import cv2
 import numpy as np
+import onnxruntime
 import torch
-from torchvision import transforms
 
+from face_alignment.alignment import norm_crop
 from face_detection.scrfd.detector import SCRFD
 from face_detection.yolov5_face.detector import Yolov5Face
 from face_recognition.arcface.model import iresnet_inference
-from face_recognition.arcface.utils import read_features
+from face_recognition.arcface.feature_store import (
+    FeatureStore,
+    check_features_backbone,
+    near_duplicate_mask,
+    store_path,
+)
+from face_recognition.arcface.utils import FacePreprocessor
 
 # Check if CUDA is available and set the device accordingly
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# Initialize the face detector (Choose one of the detectors)
-# detector = Yolov5Face(model_file="face_detection/yolov5_face/weights/yolov5n-face.pt")
-detector = SCRFD(model_file="face_detection/scrfd/weights/scrfd_2.5g_bnkps.onnx")
+DETECTOR_MODEL = "face_detection/scrfd/weights/scrfd_2.5g_bnkps.onnx"
 
-# Initialize the face recognizer
-recognizer = iresnet_inference(
-    model_name="r100", path="face_recognition/arcface/weights/arcface_r100.pth", device=device
-)
+# ArcFace backbone, recorded in the feature store so its embeddings are never mixed with another one
+RECOGNIZER_BACKBONE = "r100"
+RECOGNIZER_WEIGHTS = "face_recognition/arcface/weights/arcface_{}.pth"
+
+# Models are loaded on first use, so enrollment worker processes only load the detector
+detector = None
+recognizer = None
+face_preprocess = FacePreprocessor()
+
+
+def load_detector(num_threads=0):
+    """
+    Initialize the face detector once.
+
+    Args:
+        num_threads (int): onnxruntime intra-op threads, 0 lets onnxruntime use every core.
+    """
+    global detector
+    if detector is None:
+        # Initialize the face detector (Choose one of the detectors)
+        # detector = Yolov5Face(model_file="face_detection/yolov5_face/weights/yolov5n-face.pt")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        detector = SCRFD(
+            model_file=DETECTOR_MODEL,
+            session=onnxruntime.InferenceSession(DETECTOR_MODEL, options, providers=["CPUExecutionProvider"]),
+        )
+    return detector
+
+
+def load_recognizer():
+    """Initialize the face recognizer once."""
+    global recognizer
+    if recognizer is None:
+        recognizer = iresnet_inference(
+            model_name=RECOGNIZER_BACKBONE,
+            path=RECOGNIZER_WEIGHTS.format(RECOGNIZER_BACKBONE),
+            device=device,
+            optimize=True,
+        )
+    return recognizer
 
 
 @torch.no_grad()
@@ -36,81 +80,192 @@ def get_feature(face_image):
     Returns:
         numpy.ndarray: Extracted facial features.
     """
-    # Define a series of image preprocessing steps
-    face_preprocess = transforms.Compose(
-        [
-            transforms.ToTensor(),
-            transforms.Resize((112, 112)),
-            transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5]),
-        ]
-    )
-
-    # Convert the image to RGB format
-    face_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
-
-    # Apply the defined preprocessing to the image
-    face_image = face_preprocess(face_image).unsqueeze(0).to(device)
+    # Convert the image to a normalized RGB 1 x 3 x 112 x 112 batch
+    face_image = torch.from_numpy(face_preprocess(face_image)).to(device)
 
     # Use the model to obtain facial features
-    emb_img_face = recognizer(face_image)[0].cpu().numpy()
+    emb_img_face = load_recognizer()(face_image)[0].cpu().numpy()
 
     # Normalize the features
     images_emb = emb_img_face / np.linalg.norm(emb_img_face)
     return images_emb
 
 
-def add_persons(backup_dir, add_persons_dir, faces_save_dir, features_path):
+@torch.no_grad()
+def get_features(face_images):
+    """
+    Extract facial features from a batch of images with a single forward pass.
+
+    Args:
+        face_images (list): Input facial images.
+
+    Returns:
+        numpy.ndarray: Extracted facial features, one normalized row per image.
+    """
+    # Convert every image to RGB and normalize it into one N x 3 x 112 x 112 batch
+    batch = torch.from_numpy(face_preprocess(face_images)).to(device)
+
+    # Use the model to obtain facial features
+    emb_img_faces = load_recognizer()(batch).cpu().numpy()
+
+    # Normalize the features
+    return emb_img_faces / np.linalg.norm(emb_img_faces, axis=1, keepdims=True)
+
+
+def init_detection_worker():
+    """Give every worker process its own single-threaded detector."""
+    cv2.setNumThreads(1)
+    load_detector(num_threads=1)
+
+
+def detect_faces(image_path):
+    """
+    Decode an image and align its faces, the first enrollment stage.
+
+    Faces are aligned from the detector landmarks with the same `norm_crop` the
+    recognizer applies to live faces, so both sides embed comparable crops.
+
+    Args:
+        image_path (str): Path of the image.
+
+    Returns:
+        tuple: The aligned faces and the seconds spent.
+    """
+    start = time.perf_counter()
+    input_image = cv2.imread(image_path)
+    if input_image is None:
+        return [], time.perf_counter() - start
+
+    # Detect faces and landmarks using the face detector
+    bboxes, landmarks = load_detector().detect(image=input_image)
+
+    # Align faces
+    face_images = []
+    for i in range(len(bboxes)):
+        face_images.append(norm_crop(img=input_image, landmark=landmarks[i]))
+
+    return face_images, time.perf_counter() - start
+
+
+def align_saved_face(image_path):
+    """
+    Re-detect a face saved by an older enrollment and align it.
+
+    Older enrollments saved the raw bounding box crop, the face is detected again
+    inside it to recover the landmarks.
+
+    Args:
+        image_path (str): Path of the saved face.
+
+    Returns:
+        numpy.ndarray: The aligned face, None if no face is found.
+    """
+    face_image = cv2.imread(image_path)
+    if face_image is None:
+        return None
+
+    # Raw crops are tight around the face, give the detector some context back
+    pad = max(face_image.shape[:2]) // 4
+    padded = cv2.copyMakeBorder(face_image, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=0)
+
+    bboxes, landmarks = load_detector().detect(image=padded, max_num=1)
+    if len(bboxes) == 0:
+        return None
+    return norm_crop(img=padded, landmark=landmarks[0])
+
+
+def print_throughput(stage_stats, workers, total_images, elapsed):
+    """Print the images/sec (faces/sec) of every enrollment stage."""
+    print(f"{'stage':<10} {'items':>8} {'busy s':>9} {'items/sec':>10}")
+    for stage, (items, busy) in stage_stats.items():
+        # Detection runs in `workers` processes at the same time
+        parallel = max(workers, 1) if stage == "detect" else 1
+        rate = items * parallel / busy if busy > 0 else 0.0
+        print(f"{stage:<10} {items:>8} {busy:>9.2f} {rate:>10.1f}")
+    print(f"Total: {total_images} images in {elapsed:.2f} s ({total_images / max(elapsed, 1e-9):.1f} images/sec)")
+
+
+def add_persons(
+    backup_dir, add_persons_dir, faces_save_dir, features_path, workers=0, batch_size=32, dedup_thresh=0.95
+):
     """
     Add a new person to the face recognition database.
 
+    Images are decoded and detected in `workers` processes (in this process if 0)
+    while the faces already found are embedded in batches. Only the faces that are
+    not near-duplicates are saved.
+
     Args:
         backup_dir (str): Directory to save backup data.
         add_persons_dir (str): Directory containing images of the new person.
         faces_save_dir (str): Directory to save the extracted faces.
         features_path (str): Path to save face features.
+        workers (int): Number of decoding and detection processes.
+        batch_size (int): Number of faces embedded per forward pass.
+        dedup_thresh (float): Cosine similarity above which a face duplicates one of the same person.
     """
-    # Initialize lists to store names and features of added images
+    # Fail before embedding anything if the store holds another backbone
+    check_features_backbone(features_path, RECOGNIZER_BACKBONE)
+
+    # Initialize lists to store names, faces and features of added images
     images_name = []
+    images_face = []
     images_emb = []
 
-    # Read the folder with images of the new person, extract faces, and save them
+    # Collect the images of every new person
+    image_jobs = []
+    face_counters = {}
     for name_person in os.listdir(add_persons_dir):
         person_image_path = os.path.join(add_persons_dir, name_person)
 
-        # Create a directory to save the faces of the person
+        # Create a directory to save the faces of the person and count the faces already there once
         person_face_path = os.path.join(faces_save_dir, name_person)
         os.makedirs(person_face_path, exist_ok=True)
+        face_counters[name_person] = len(os.listdir(person_face_path))
 
         for image_name in os.listdir(person_image_path):
             if image_name.endswith(("png", "jpg", "jpeg")):
-                input_image = cv2.imread(os.path.join(person_image_path, image_name))
-
-                # Detect faces and landmarks using the face detector
-                bboxes, landmarks = detector.detect(image=input_image)
-
-                # Extract faces
-                for i in range(len(bboxes)):
-                    # Get the number of files in the person's path
-                    number_files = len(os.listdir(person_face_path))
-
-                    # Get the location of the face
-                    x1, y1, x2, y2, score = bboxes[i]
-
-                    # Extract the face from the image
-                    face_image = input_image[y1:y2, x1:x2]
-
-                    # Path to save the face
-                    path_save_face = os.path.join(person_face_path, f"{number_files}.jpg")
-
-                    # Save the face to the database
-                    cv2.imwrite(path_save_face, face_image)
-
-                    # Extract features from the face
-                    images_emb.append(get_feature(face_image=face_image))
-                    images_name.append(name_person)
+                image_jobs.append((name_person, os.path.join(person_image_path, image_name)))
+
+    stage_stats = {"detect": [0, 0.0], "save": [0, 0.0], "embed": [0, 0.0]}
+    start_time = time.perf_counter()
+
+    pool = None
+    image_paths = [image_path for _, image_path in image_jobs]
+    if workers > 0:
+        pool = multiprocessing.get_context("spawn").Pool(workers, initializer=init_detection_worker)
+        detections = pool.imap(detect_faces, image_paths, chunksize=4)
+    else:
+        detections = map(detect_faces, image_paths)
+
+    pending_names = []
+    pending_faces = []
+    for i, ((name_person, _), (face_images, detect_time)) in enumerate(zip(image_jobs, detections)):
+        stage_stats["detect"][0] += 1
+        stage_stats["detect"][1] += detect_time
+
+        for face_image in face_images:
+            pending_faces.append(face_image)
+            pending_names.append(name_person)
+
+        # Extract features once a batch is full, or after the last image
+        if pending_faces and (len(pending_faces) >= batch_size or i == len(image_jobs) - 1):
+            embed_start = time.perf_counter()
+            images_emb.extend(get_features(pending_faces))
+            images_name.extend(pending_names)
+            images_face.extend(pending_faces)
+            stage_stats["embed"][0] += len(pending_faces)
+            stage_stats["embed"][1] += time.perf_counter() - embed_start
+            pending_names = []
+            pending_faces = []
+
+    if pool is not None:
+        pool.close()
+        pool.join()
 
     # Check if no new person is found
     if images_emb == [] and images_name == []:
+        print_throughput(stage_stats, workers, len(image_jobs), time.perf_counter() - start_time)
         print("No new person found!")
         return None
 
@@ -118,21 +273,36 @@ def add_persons(backup_dir, add_persons_dir, faces_save_dir, features_path):
     images_emb = np.array(images_emb)
     images_name = np.array(images_name)
 
-    # Read existing features if available
-    features = read_features(features_path)
-
-    if features is not None:
-        # Unpack existing features
-        old_images_name, old_images_emb = features
-
-        # Combine new features with existing features
-        images_name = np.hstack((old_images_name, images_name))
-        images_emb = np.vstack((old_images_emb, images_emb))
-
-        print("Update features!")
-
-    # Save the combined features
-    np.savez_compressed(features_path, images_name=images_name, images_emb=images_emb)
+    # Open the append-only feature store, starting from the legacy .npz file if there is one
+    store = FeatureStore(store_path(features_path))
+    if not store.exists() and os.path.exists(features_path + ".npz"):
+        store.import_npz(features_path + ".npz")
+        print("Imported existing features into the feature store!")
+
+    # Skip near-duplicates of the person's existing and new faces, such as burst shots
+    known = store.read()
+    known_names, known_embs = known if known is not None else (None, None)
+    keep = near_duplicate_mask(images_name, images_emb, dedup_thresh, known_names, known_embs)
+    print(f"Pruned {int((~keep).sum())} near-duplicate faces out of {len(keep)}.")
+    images_name = images_name[keep]
+    images_emb = images_emb[keep]
+    images_face = [face_image for face_image, kept in zip(images_face, keep) if kept]
+
+    # Save the kept faces to the database, --realign re-embeds them later
+    save_start = time.perf_counter()
+    for name_person, face_image in zip(images_name, images_face):
+        path_save_face = os.path.join(faces_save_dir, name_person, f"{face_counters[name_person]}.jpg")
+        face_counters[name_person] += 1
+        cv2.imwrite(path_save_face, face_image)
+    stage_stats["save"][0] += len(images_name)
+    stage_stats["save"][1] += time.perf_counter() - save_start
+
+    print_throughput(stage_stats, workers, len(image_jobs), time.perf_counter() - start_time)
+
+    # Save the new features as a new shard, existing shards are not rewritten
+    if len(images_name):
+        store.append(images_name, images_emb, backbone=RECOGNIZER_BACKBONE)
+    print(f"Update features! {len(store)} embeddings in the store.")
 
     # Move the data of the new person to the backup data directory
     for sub_dir in os.listdir(add_persons_dir):
@@ -142,6 +312,72 @@ def add_persons(backup_dir, add_persons_dir, faces_save_dir, features_path):
     print("Successfully added new person!")
 
 
+
+def realign_faces(faces_save_dir, features_path, workers=0, batch_size=32, dedup_thresh=0.95):
+    """
+    Re-embed every saved face into a new feature store, aligned like new enrollments.
+
+    Args:
+        faces_save_dir (str): Directory of the saved faces, one sub directory per person.
+        features_path (str): Path of the new face features, its store must not exist yet.
+        workers (int): Number of decoding and detection processes.
+        batch_size (int): Number of faces embedded per forward pass.
+        dedup_thresh (float): Cosine similarity above which a face duplicates one of the same person.
+    """
+    store = FeatureStore(store_path(features_path))
+    if store.exists():
+        raise FileExistsError(f"{store.path} already exists, choose a new features path")
+
+    face_jobs = []
+    for name_person in sorted(os.listdir(faces_save_dir)):
+        person_face_path = os.path.join(faces_save_dir, name_person)
+        for face_name in sorted(os.listdir(person_face_path)):
+            face_jobs.append((name_person, os.path.join(person_face_path, face_name)))
+
+    pool = None
+    face_paths = [face_path for _, face_path in face_jobs]
+    if workers > 0:
+        pool = multiprocessing.get_context("spawn").Pool(workers, initializer=init_detection_worker)
+        aligned_faces = pool.imap(align_saved_face, face_paths, chunksize=16)
+    else:
+        aligned_faces = map(align_saved_face, face_paths)
+
+    images_name = []
+    images_emb = []
+    pending_names = []
+    pending_faces = []
+    missed = 0
+    for i, ((name_person, _), face_image) in enumerate(zip(face_jobs, aligned_faces)):
+        if face_image is None:
+            missed += 1
+        else:
+            pending_faces.append(face_image)
+            pending_names.append(name_person)
+
+        if pending_faces and (len(pending_faces) >= batch_size or i == len(face_jobs) - 1):
+            images_emb.extend(get_features(pending_faces))
+            images_name.extend(pending_names)
+            pending_names = []
+            pending_faces = []
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if images_emb == []:
+        print("No face to realign!")
+        return None
+
+    # Faces saved before near-duplicates were pruned, such as burst shots, are pruned now
+    images_name = np.array(images_name)
+    images_emb = np.array(images_emb)
+    keep = near_duplicate_mask(images_name, images_emb, dedup_thresh)
+    print(f"Pruned {int((~keep).sum())} near-duplicate faces out of {len(keep)}.")
+
+    store.append(images_name[keep], images_emb[keep], backbone=RECOGNIZER_BACKBONE)
+    print(f"Realigned {len(store)} faces into {store.path}, no face found in {missed} images.")
+
+
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser()
@@ -169,7 +405,55 @@ if __name__ == "__main__":
         default="./datasets/face_features/feature",
         help="Path to save face features.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of processes decoding images and detecting faces (0: in the main process).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Number of faces embedded per forward pass.",
+    )
+    parser.add_argument(
+        "--dedup-thresh",
+        type=float,
+        default=0.95,
+        help="Cosine similarity above which a face duplicates one already kept for the person.",
+    )
+    parser.add_argument(
+        "--backbone",
+        type=str,
+        default="r100",
+        choices=["r18", "r34", "r50", "r100"],
+        help="ArcFace backbone, its weights are face_recognition/arcface/weights/arcface_<backbone>.pth.",
+    )
+    parser.add_argument(
+        "--realign",
+        action="store_true",
+        help="Re-embed the faces in --faces-save-dir into a new store at --features-path, aligned.",
+    )
     opt = parser.parse_args()
-
-    # Run the main function
-    add_persons(**vars(opt))
+    RECOGNIZER_BACKBONE = opt.backbone
+
+    if opt.realign:
+        realign_faces(
+            opt.faces_save_dir,
+            opt.features_path,
+            workers=opt.workers,
+            batch_size=opt.batch_size,
+            dedup_thresh=opt.dedup_thresh,
+        )
+    else:
+        # Run the main function
+        add_persons(
+            opt.backup_dir,
+            opt.add_persons_dir,
+            opt.faces_save_dir,
+            opt.features_path,
+            opt.workers,
+            opt.batch_size,
+            opt.dedup_thresh,
+        )
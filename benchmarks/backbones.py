@@ -0,0 +1,110 @@
+"""
+Compare ArcFace backbones on local data: latency per face and gallery self-match accuracy.
+
+Run from the repository root:
+
+    python -m benchmarks.backbones --backbones r18 r34 r50 r100 --faces-dir datasets/data
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+from face_recognition.arcface.model import IResNetEmbedder, iresnet_inference
+from face_recognition.arcface.utils import FacePreprocessor, load_images
+
+
+def self_match_accuracy(names, embeddings):
+    """Share of faces whose nearest other face is the same person, people with a single face are skipped."""
+    sims = embeddings @ embeddings.T
+    np.fill_diagonal(sims, -np.inf)
+    nearest = names[np.argmax(sims, axis=1)]
+
+    people, counts = np.unique(names, return_counts=True)
+    has_pair = np.isin(names, people[counts > 1])
+    if not has_pair.any():
+        return float("nan")
+    return float((nearest == names)[has_pair].mean())
+
+
+def benchmark(backbones, weights, faces_dir, batch_size, iterations, max_accuracy_drop):
+    device = torch.device("cpu")
+    faces, names = load_images(faces_dir)
+    preprocess = FacePreprocessor()
+    rng = np.random.default_rng(0)
+
+    results = []
+    print(f"{'backbone':>8} {'ms/face':>10} {'self-match':>11}")
+    for backbone in backbones:
+        path = weights.format(backbone)
+        if not os.path.exists(path):
+            print(f"{backbone:>8} weights {path} not found, skipped")
+            continue
+        embedder = IResNetEmbedder(iresnet_inference(model_name=backbone, path=path, device=device), device)
+
+        embeddings = np.concatenate(
+            [embedder(preprocess(faces[i : i + batch_size])) for i in range(0, len(faces), batch_size)]
+        )
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        accuracy = self_match_accuracy(names, embeddings)
+
+        # Latency does not depend on the content, time full batches even with few local faces
+        batch = rng.uniform(-1, 1, (batch_size, 3, 112, 112)).astype(np.float32)
+        embedder(batch)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            embedder(batch)
+        ms_per_face = 1e3 * (time.perf_counter() - start) / (iterations * batch_size)
+
+        results.append((backbone, ms_per_face, accuracy))
+        print(f"{backbone:>8} {ms_per_face:>10.2f} {accuracy:>11.3f}")
+
+    measured = [result for result in results if not np.isnan(result[2])]
+    if measured:
+        best_accuracy = max(accuracy for _, _, accuracy in measured)
+        candidates = [result for result in measured if result[2] >= best_accuracy - max_accuracy_drop]
+        backbone, ms_per_face, accuracy = min(candidates, key=lambda result: result[1])
+        print(
+            f"Fastest backbone within {max_accuracy_drop:.1%} of the best self-match: "
+            f"{backbone} ({ms_per_face:.2f} ms/face, {accuracy:.3f})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backbones", type=str, nargs="+", default=["r18", "r34", "r50", "r100"], help="Backbones to compare."
+    )
+    parser.add_argument(
+        "--weights",
+        type=str,
+        default="face_recognition/arcface/weights/arcface_{}.pth",
+        help="Weights path, {} is replaced by the backbone.",
+    )
+    parser.add_argument(
+        "--faces-dir", type=str, default="./datasets/data", help="Aligned faces, one sub directory per person."
+    )
+    parser.add_argument("--batch-size", type=int, default=16, help="Faces per forward pass.")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed batches per backbone.")
+    parser.add_argument(
+        "--max-accuracy-drop",
+        type=float,
+        default=0.01,
+        help="Self-match accuracy a faster backbone may lose against the best one.",
+    )
+    parser.add_argument("--threads", type=int, default=None, help="Number of torch CPU threads.")
+    opt = parser.parse_args()
+
+    if opt.threads is not None:
+        torch.set_num_threads(opt.threads)
+
+    benchmark(
+        backbones=opt.backbones,
+        weights=opt.weights,
+        faces_dir=opt.faces_dir,
+        batch_size=opt.batch_size,
+        iterations=opt.iterations,
+        max_accuracy_drop=opt.max_accuracy_drop,
+    )
@@ -0,0 +1,108 @@
+"""
+Benchmark SCRFD anchor decoding on synthetic 640x640 model outputs with few faces.
+
+Compares SCRFD.decode (score threshold first, cached anchor tables) with decoding
+every anchor before thresholding. Run from the repository root:
+
+    python -m benchmarks.detection_decode --input-size 640 --faces 3
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from face_detection.scrfd.detector import SCRFD
+
+
+class OutputsOnlySession:
+    """Exposes the input/output metadata of a batched 9-output SCRFD model, no inference."""
+
+    def __init__(self, input_size):
+        self.input_size = input_size
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input.1", shape=["batch", 3, self.input_size, self.input_size])]
+
+    def get_outputs(self):
+        return [SimpleNamespace(name=f"out{i}", shape=["batch", "anchors", 1]) for i in range(9)]
+
+
+def synthetic_outputs(input_size, faces, rng, strides=(8, 16, 32), num_anchors=2):
+    scores, bboxes, kpss = [], [], []
+    for stride in strides:
+        k = (input_size // stride) ** 2 * num_anchors
+        s = rng.uniform(0, 0.3, size=(1, k, 1)).astype(np.float32)
+        s[0, rng.choice(k, size=faces, replace=False), 0] = 0.9
+        scores.append(s)
+        bboxes.append(rng.uniform(0, 4, size=(1, k, 4)).astype(np.float32))
+        kpss.append(rng.uniform(-2, 2, size=(1, k, 10)).astype(np.float32))
+    return scores + bboxes + kpss
+
+
+def decode_all_anchors(detector, net_outs, input_height, input_width, thresh):
+    """Reference: decode every anchor, then keep the ones above the threshold."""
+    scores_list, bboxes_list, kpss_list = [], [], []
+    fmc = detector.fmc
+    for idx, stride in enumerate(detector._feat_stride_fpn):
+        scores = net_outs[idx][0]
+        bbox_preds = net_outs[idx + fmc][0] * stride
+        kps_preds = net_outs[idx + fmc * 2][0] * stride
+
+        height = input_height // stride
+        width = input_width // stride
+        anchor_centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+        anchor_centers = (anchor_centers * stride).reshape((-1, 2))
+        anchor_centers = np.stack([anchor_centers] * detector._num_anchors, axis=1).reshape((-1, 2))
+
+        pos_inds = np.where(scores >= thresh)[0]
+        x1 = anchor_centers[:, 0] - bbox_preds[:, 0]
+        y1 = anchor_centers[:, 1] - bbox_preds[:, 1]
+        x2 = anchor_centers[:, 0] + bbox_preds[:, 2]
+        y2 = anchor_centers[:, 1] + bbox_preds[:, 3]
+        bboxes = np.stack([x1, y1, x2, y2], axis=-1)
+        preds = []
+        for i in range(0, kps_preds.shape[1], 2):
+            preds.append(anchor_centers[:, 0] + kps_preds[:, i])
+            preds.append(anchor_centers[:, 1] + kps_preds[:, i + 1])
+        kpss = np.stack(preds, axis=-1).reshape((kps_preds.shape[0], -1, 2))
+
+        scores_list.append(scores[pos_inds])
+        bboxes_list.append(bboxes[pos_inds])
+        kpss_list.append(kpss[pos_inds])
+    return scores_list, bboxes_list, kpss_list
+
+
+def timeit(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def benchmark(input_size, faces, thresh, repeats):
+    rng = np.random.default_rng(0)
+    detector = SCRFD(session=OutputsOnlySession(input_size))
+    net_outs = synthetic_outputs(input_size, faces, rng)
+
+    expected = decode_all_anchors(detector, net_outs, input_size, input_size, thresh)
+    actual = detector.decode(net_outs, 0, input_size, input_size, thresh)
+    for e, a in zip(expected, actual):
+        assert all(np.allclose(x, y) for x, y in zip(e, a)), "threshold-first decoding differs"
+
+    full_time = timeit(lambda: decode_all_anchors(detector, net_outs, input_size, input_size, thresh), repeats)
+    fast_time = timeit(lambda: detector.decode(net_outs, 0, input_size, input_size, thresh), repeats)
+    print(f"input {input_size}x{input_size}, {faces} faces per stride")
+    print(f"decode all anchors: {1e3 * full_time:.3f} ms")
+    print(f"threshold first:    {1e3 * fast_time:.3f} ms ({full_time / fast_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-size", type=int, default=640, help="Square model input size.")
+    parser.add_argument("--faces", type=int, default=3, help="Anchors above the threshold per stride.")
+    parser.add_argument("--thresh", type=float, default=0.5, help="Score threshold.")
+    parser.add_argument("--repeats", type=int, default=50, help="Timed repetitions.")
+    opt = parser.parse_args()
+
+    benchmark(input_size=opt.input_size, faces=opt.faces, thresh=opt.thresh, repeats=opt.repeats)
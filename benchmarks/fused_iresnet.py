@@ -0,0 +1,72 @@
+"""
+Check the BatchNorm-folded, frozen IResNet against the original one and compare their speed.
+
+Run from the repository root:
+
+    python -m benchmarks.fused_iresnet --model-name r100 --weights face_recognition/arcface/weights/arcface_r100.pth
+
+Exits with status 1 when the embeddings differ by more than --atol.
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+import torch
+
+from face_recognition.arcface.model import iresnet18, iresnet34, iresnet50, iresnet100, optimize_iresnet
+
+BACKBONES = {"r18": iresnet18, "r34": iresnet34, "r50": iresnet50, "r100": iresnet100}
+
+
+def timeit(model, batch, repeats):
+    model(batch)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model(batch)
+    return (time.perf_counter() - start) / repeats
+
+
+@torch.no_grad()
+def check(model_name, weights, batch_size, repeats, atol):
+    device = torch.device("cpu")
+    model = BACKBONES[model_name]()
+    if os.path.exists(weights):
+        model.load_state_dict(torch.load(weights, map_location=device))
+    else:
+        # Random weights leave the BatchNorm statistics at their defaults, the check is weaker
+        print(f"Weights {weights} not found, checking a randomly initialized {model_name}")
+    model.to(device).eval()
+
+    frozen = optimize_iresnet(copy.deepcopy(model), device)
+
+    batch = torch.rand(batch_size, 3, 112, 112, device=device) * 2 - 1
+    max_diff = (frozen(batch) - model(batch)).abs().max().item()
+    original_time = timeit(model, batch, repeats)
+    frozen_time = timeit(frozen, batch, repeats)
+
+    print(f"{model_name}, batch {batch_size}")
+    print(f"max embedding difference: {max_diff:.2e}")
+    print(f"original: {1e3 * original_time:.1f} ms")
+    print(f"fused:    {1e3 * frozen_time:.1f} ms ({original_time / frozen_time:.2f}x)")
+    return max_diff <= atol
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-name", type=str, default="r100", choices=list(BACKBONES), help="ArcFace backbone.")
+    parser.add_argument(
+        "--weights",
+        type=str,
+        default="face_recognition/arcface/weights/arcface_r100.pth",
+        help="Path to the ArcFace weights.",
+    )
+    parser.add_argument("--batch-size", type=int, default=8, help="Faces per forward pass.")
+    parser.add_argument("--repeats", type=int, default=10, help="Timed forward passes.")
+    parser.add_argument("--atol", type=float, default=1e-4, help="Largest absolute embedding difference accepted.")
+    opt = parser.parse_args()
+
+    if not check(opt.model_name, opt.weights, opt.batch_size, opt.repeats, opt.atol):
+        print(f"Fused IResNet differs from the original one by more than {opt.atol:.0e}")
+        sys.exit(1)
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of the vectorized IoU kernel against the pairwise Python loop.
+
+Run from the repository root:
+
+    python -m benchmarks.iou --sizes 50 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from face_tracking.tracker.matching import bbox_iou, bbox_ious
+
+
+def loop_ious(atlbrs, btlbrs, pixel_offset=0):
+    """Reference double loop, the previous implementation of matching.ious and Recognizer.mapping_bbox."""
+    ious = np.zeros((len(atlbrs), len(btlbrs)), dtype=np.float64)
+    for i, box1 in enumerate(atlbrs):
+        for j, box2 in enumerate(btlbrs):
+            if pixel_offset == 0:
+                ious[i, j] = bbox_iou(box1, box2)
+                continue
+            inter = max(0, min(box1[2], box2[2]) - max(box1[0], box2[0]) + 1) * max(
+                0, min(box1[3], box2[3]) - max(box1[1], box2[1]) + 1
+            )
+            area1 = (box1[2] - box1[0] + 1) * (box1[3] - box1[1] + 1)
+            area2 = (box2[2] - box2[0] + 1) * (box2[3] - box2[1] + 1)
+            ious[i, j] = inter / (area1 + area2 - inter)
+    return ious
+
+
+def random_tlbrs(rng, n, width=1920, height=1080):
+    tl = rng.uniform(0, [width - 100, height - 100], size=(n, 2))
+    wh = rng.uniform(10, 100, size=(n, 2))
+    return np.hstack((tl, tl + wh))
+
+
+def timeit(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def benchmark(sizes, repeats):
+    rng = np.random.default_rng(0)
+    print(f"{'tracks x dets':>14} {'offset':>7} {'loop ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for size in sizes:
+        tracks = random_tlbrs(rng, size)
+        # Detections are jittered copies of the tracks so that many pairs overlap
+        detections = tracks + rng.normal(0, 3, size=tracks.shape)
+
+        for pixel_offset in (0, 1):
+            expected = loop_ious(tracks, detections, pixel_offset)
+            actual = bbox_ious(tracks, detections, pixel_offset)
+            assert np.array_equal(expected, actual), "vectorized IoU differs from the loop"
+
+            loop_time = timeit(lambda: loop_ious(tracks, detections, pixel_offset), repeats)
+            vector_time = timeit(lambda: bbox_ious(tracks, detections, pixel_offset), repeats)
+            print(
+                f"{f'{size}x{size}':>14} {pixel_offset:>7} {1e3 * loop_time:>10.3f} "
+                f"{1e3 * vector_time:>10.3f} {loop_time / vector_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200], help="Numbers of tracks and detections.")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repetitions per size.")
+    opt = parser.parse_args()
+
+    benchmark(sizes=opt.sizes, repeats=opt.repeats)
@@ -0,0 +1,108 @@
+"""
+Benchmark batched ArcFace embedding extraction on CPU.
+
+Run from the repository root:
+
+    python -m benchmarks.recognition --batch-sizes 1 4 16 32
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+from face_recognition.arcface.model import (
+    IResNetEmbedder,
+    iresnet18,
+    iresnet34,
+    iresnet50,
+    iresnet100,
+    iresnet_inference,
+    optimize_iresnet,
+)
+from face_recognition.arcface.onnx_model import ArcFaceONNX
+from face_recognition.arcface.utils import FacePreprocessor, batch_compare_encodings
+
+BACKBONES = {"r18": iresnet18, "r34": iresnet34, "r50": iresnet50, "r100": iresnet100}
+
+
+def load_model(model_name, weights, device, optimize=False):
+    """Load the recognizer, falling back to random weights when none are available (speed only)."""
+    if os.path.exists(weights):
+        return iresnet_inference(model_name=model_name, path=weights, device=device, optimize=optimize)
+    print(f"Weights {weights} not found, benchmarking a randomly initialized {model_name}")
+    model = BACKBONES[model_name]().to(device).eval()
+    return optimize_iresnet(model, device) if optimize else model
+
+
+def benchmark(batch_sizes, iterations, warmup, gallery_size, model_name, weights, onnx_model=None, optimize=False):
+    device = torch.device("cpu")
+    if onnx_model is not None:
+        recognizer = ArcFaceONNX(onnx_model)
+    else:
+        recognizer = IResNetEmbedder(load_model(model_name, weights, device, optimize), device)
+    preprocess = FacePreprocessor()
+
+    def get_features(faces):
+        # Same steps as ModelPool.get_features: one preprocessed batch, one forward pass, normalized rows
+        embeddings = recognizer(preprocess(faces))
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    rng = np.random.default_rng(0)
+    gallery = rng.standard_normal((gallery_size, 512)).astype(np.float32)
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+
+    print(f"{'batch':>6} {'faces/sec':>12} {'ms/batch':>10}")
+    for batch_size in batch_sizes:
+        faces = [rng.integers(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(batch_size)]
+
+        for _ in range(warmup):
+            batch_compare_encodings(get_features(faces), gallery)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            batch_compare_encodings(get_features(faces), gallery)
+        elapsed = time.perf_counter() - start
+
+        print(f"{batch_size:>6} {batch_size * iterations / elapsed:>12.1f} {1e3 * elapsed / iterations:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 32], help="Batch sizes to measure.")
+    parser.add_argument("--iterations", type=int, default=10, help="Timed iterations per batch size.")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed iterations per batch size.")
+    parser.add_argument("--gallery-size", type=int, default=1000, help="Number of enrolled embeddings.")
+    parser.add_argument("--model-name", type=str, default="r100", choices=list(BACKBONES), help="ArcFace backbone.")
+    parser.add_argument(
+        "--weights",
+        type=str,
+        default="face_recognition/arcface/weights/arcface_r100.pth",
+        help="Path to the ArcFace weights.",
+    )
+    parser.add_argument(
+        "--onnx-model",
+        type=str,
+        default=None,
+        help="Benchmark this exported ONNX model with onnxruntime instead of PyTorch.",
+    )
+    parser.add_argument(
+        "--optimize", action="store_true", help="Fold the BatchNorm layers and freeze the traced model."
+    )
+    parser.add_argument("--threads", type=int, default=None, help="Number of torch CPU threads.")
+    opt = parser.parse_args()
+
+    if opt.threads is not None:
+        torch.set_num_threads(opt.threads)
+
+    benchmark(
+        batch_sizes=opt.batch_sizes,
+        iterations=opt.iterations,
+        warmup=opt.warmup,
+        gallery_size=opt.gallery_size,
+        model_name=opt.model_name,
+        weights=opt.weights,
+        onnx_model=opt.onnx_model,
+        optimize=opt.optimize,
+    )
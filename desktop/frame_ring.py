@@ -0,0 +1,73 @@
+import contextlib
+import threading
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    Preallocated frame buffers, written by the tracking thread and read by the UI by index.
+
+    The writer copies every frame into a buffer that is neither the latest one nor leased
+    by a reader, then publishes its index with a new version. A reader leases the latest
+    buffer and can wrap it without copying it, it is not overwritten until released.
+    The buffers are only reallocated when the frame shape changes. There is a single writer.
+    """
+
+    def __init__(self, slots: int = 3):
+        # One buffer for the writer, one for the latest frame and one per reader holding an older frame
+        assert slots >= 3
+        self.slots = slots
+        self.buffers = []
+        self.leases = [0] * slots
+        self.latest = None
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def write(self, frame):
+        """
+        Copy a frame into a free buffer and publish it.
+
+        Returns:
+            int: The version of the frame.
+        """
+        with self._lock:
+            if not self.buffers or self.buffers[0].shape != frame.shape or self.buffers[0].dtype != frame.dtype:
+                # Readers keep the old buffers they hold
+                self.buffers = [np.empty_like(frame) for _ in range(self.slots)]
+                self.leases = [0] * self.slots
+                self.latest = None
+            index = next(i for i in range(self.slots) if i != self.latest and self.leases[i] == 0)
+            buffer = self.buffers[index]
+
+        # Nobody reads this buffer until it is published
+        np.copyto(buffer, frame)
+
+        with self._lock:
+            self.latest = index
+            self.version += 1
+            return self.version
+
+    @contextlib.contextmanager
+    def read(self):
+        """
+        Lease the latest frame.
+
+        Yields:
+            tuple: The frame buffer, not to be kept after the lease, and its version. (None, 0) before the first frame.
+        """
+        with self._lock:
+            if self.latest is None:
+                index, frame = None, None
+            else:
+                index, frame = self.latest, self.buffers[self.latest]
+                self.leases[index] += 1
+            buffers, version = self.buffers, self.version
+        try:
+            yield frame, version
+        finally:
+            if index is not None:
+                with self._lock:
+                    # A lease on reallocated buffers does not hold the new ones
+                    if buffers is self.buffers:
+                        self.leases[index] -= 1
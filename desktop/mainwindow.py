@@ -4,7 +4,7 @@ from pathlib import Path
 import cv2
 from PySide6.QtWidgets import QMainWindow, QFileDialog
 from PySide6.QtCore import QTimer, Qt, QRect, QPoint
-from PySide6.QtGui import QImage, QPixmap, QPainter, QColor, QPen
+from PySide6.QtGui import QPixmap, QColor, QPen
 
 from desktop.view.dialog.scale_dialog import ScaleDialog
 from desktop.view.widget.marked_persons_widget import MarkedPersonsWidget
@@ -16,6 +16,7 @@ from desktop.view.dialog.network_url_dialog import NetworkUrlDialog
 from desktop.view.ui.mainwindow import Ui_MainWindow
 
 from desktop.video_source.network import NetworkVideoSource
+from desktop.video_source.threaded import ThreadedVideoSource
 from desktop.view.widget.rectangles_list_label import RectanglesLabelList
 from recognizer import Recognizer  # Ensure this imports correctly
 
@@ -30,6 +31,7 @@ class MainWindow(QMainWindow):
         self.ui.setupUi(self)
 
         self.image_rectangles_label = RectanglesLabelList(self)
+        self.image_rectangles_label.set_overlay(self.paint_recognitions)
         self.ui.MainHLayout.insertWidget(0, self.image_rectangles_label)
 
         self.text_label = self.ui.TextLabel
@@ -45,7 +47,7 @@ class MainWindow(QMainWindow):
         # vs = DroidcamVideoSource("https://192.168.0.106:4343/video")
         # vs = DroidcamVideoSource("rtsp://admin:@192.168.0.69:554")
         # vs = None
-        vs = CameraByIndex(0)
+        vs = ThreadedVideoSource(CameraByIndex(0))
 
         self.recognizer = Recognizer(video_source=vs)
         self.image_rectangles_label.rectangles_changed.connect(self.recognizer.reset_mappings)
@@ -55,7 +57,6 @@ class MainWindow(QMainWindow):
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(1000 // 30)  # 30 FPS
 
-        self.frame = None
         self.scale_factor: float = 1
 
         self.recognizer.start()
@@ -72,7 +73,7 @@ class MainWindow(QMainWindow):
         dlg = NetworkUrlDialog()
         if dlg.exec():
             text = dlg.lineEdit.text()
-            self.recognizer.set_video_source(NetworkVideoSource(text))
+            self.recognizer.set_video_source(ThreadedVideoSource(NetworkVideoSource(text)))
 
     def get_camera_by_index(self):
         while True:
@@ -83,7 +84,7 @@ class MainWindow(QMainWindow):
                     index = int(text)
                 except ValueError:
                     continue
-                self.recognizer.set_video_source(CameraByIndex(index))
+                self.recognizer.set_video_source(ThreadedVideoSource(CameraByIndex(index)))
                 break
             else:
                 break
@@ -135,7 +136,7 @@ class MainWindow(QMainWindow):
         else:
             assert False, 'Invalid source type'
 
-        self.recognizer.set_video_source(source_type(save.src))
+        self.recognizer.set_video_source(ThreadedVideoSource(source_type(save.src)))
         self.image_rectangles_label.set_rectangles(save.rectangles)
         self.recognizer.set_hud_visible(save.is_hud_visible)
         self.scale_factor = save.scale_factor
@@ -148,16 +149,15 @@ class MainWindow(QMainWindow):
     def update_frame(self):
         """Update the displayed frame."""
         self.recognizer.set_detection_zones(self.image_rectangles_label.get_tlwhs())
-        self.frame = self.recognizer.get_image().copy()
-        if self.frame is not None:
-            height, width, channel = self.frame.shape
-            q_img = QImage(self.frame.data, width, height, 3 * width, QImage.Format.Format_BGR888)
 
-            self.process_recognitions()
-            self.paint_recognitions(q_img)
-            self.image_rectangles_label.set_image(q_img)
-            self.image_rectangles_label.scale(self.scale_factor)
-            self.image_rectangles_label.show_image()
+        # The frame is read in place from the ring, only a new frame is converted for display
+        with self.recognizer.frames.read() as (frame, version):
+            if frame is None:
+                frame = self.recognizer.get_image()
+            self.image_rectangles_label.set_frame(frame, version, self.scale_factor)
+
+        self.process_recognitions()
+        self.image_rectangles_label.update()
 
     def process_recognitions(self):
         for p in self.recognizer.get_recognized():
@@ -175,9 +175,7 @@ class MainWindow(QMainWindow):
                     self.marked_persons_widget_dict.add_person(p)
                     break
 
-    def paint_recognitions(self, q_img):
-        painter = QPainter(q_img)
-
+    def paint_recognitions(self, painter):
         def green():
             painter.setPen(QPen(QColor(0, 255, 0), 5))
             painter.setBrush(QColor(0, 255, 0, 0))
@@ -214,8 +212,6 @@ class MainWindow(QMainWindow):
             person_rect = QRect(*p.tlwh)
             painter.drawRect(person_rect)
 
-        painter.end()
-
     def keyPressEvent(self, event):
         """Handle key press events."""
         if event.key() == Qt.Key.Key_Z and event.modifiers() == Qt.KeyboardModifier.ControlModifier:
@@ -7,3 +7,6 @@ class VideoSource:
     @abstractmethod
     def get_frame(self):
         raise NotImplemented
+
+    def release(self):
+        pass
@@ -12,5 +12,8 @@ class NetworkVideoSource(VideoSource):
         ret, frame = self._cap.read()
         return frame
 
-    def __del__(self):
+    def release(self):
         self._cap.release()
+
+    def __del__(self):
+        self.release()
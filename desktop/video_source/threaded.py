@@ -0,0 +1,81 @@
+import threading
+import time
+
+from desktop.video_source.base import VideoSource
+
+
+class ThreadedVideoSource(VideoSource):
+    """
+    Decode frames of another video source continuously in a background thread.
+
+    Only the newest frame is kept in a single slot, frames that were replaced
+    before anyone read them are counted as dropped.
+    """
+
+    def __init__(self, source: VideoSource, timeout: float = 0.1):
+        super().__init__(source.src)
+        self._source = source
+        self._timeout = timeout
+
+        self._frame = None
+        self._timestamp = None
+        self._frame_id = 0
+        self._read_frame_id = 0
+        self.dropped_frames = 0
+
+        self._condition = threading.Condition()
+        self._is_running = True
+        self._thread = threading.Thread(target=self._grab, daemon=True)
+        self._thread.start()
+
+    def _grab(self):
+        while self._is_running:
+            frame = self._source.get_frame()
+            if not self._is_running:
+                break
+            timestamp = time.time()
+            if frame is None:
+                # Camera not ready or stream interrupted
+                time.sleep(self._timeout)
+                continue
+
+            with self._condition:
+                if self._frame_id > self._read_frame_id:
+                    self.dropped_frames += 1
+                self._frame = frame
+                self._timestamp = timestamp
+                self._frame_id += 1
+                self._condition.notify_all()
+
+        # Released here, the read may have been blocked on a stalled stream when release() was called
+        self._source.release()
+
+    def has_new_frame(self):
+        """Check, without waiting, whether a frame arrived since the last one returned."""
+        with self._condition:
+            return self._frame_id > self._read_frame_id
+
+    def get_frame(self):
+        frame, _ = self.get_frame_with_timestamp()
+        return frame
+
+    def get_frame_with_timestamp(self):
+        """
+        Wait for a frame newer than the last one returned.
+
+        Returns:
+            tuple: The newest frame and the time.time() it was decoded at, (None, None) if no new
+            frame arrives within the timeout, so the caller does not process the same frame twice.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._frame_id > self._read_frame_id, self._timeout):
+                return None, None
+            self._read_frame_id = self._frame_id
+            return self._frame, self._timestamp
+
+    def release(self):
+        """Stop grabbing without waiting, a read blocked on a stalled stream must not block the caller."""
+        self._is_running = False
+
+    def __del__(self):
+        self.release()
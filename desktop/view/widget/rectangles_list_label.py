@@ -1,5 +1,5 @@
-from PySide6.QtCore import Qt, QRect, Signal
-from PySide6.QtGui import QPainter, QColor, QPen, QImage, QPixmap
+from PySide6.QtCore import Qt, QRect, QSize, Signal
+from PySide6.QtGui import QPainter, QColor, QPen, QImage, QPixmap, QTransform
 from PySide6.QtWidgets import QWidget, QLabel
 
 from desktop.myRect import MyRect
@@ -11,8 +11,14 @@ class RectanglesLabelList(QLabel):
     def __init__(self, parent=None):
         super().__init__(parent)
 
+        # Displayed frame at the widget size, redrawn only when a new frame arrives, and the overlay
+        # painted over it each repaint. Both go through the frame-to-widget transform
+        self.frame_pixmap = QPixmap()
+        self.frame_version = None
+        self.view_transform = QTransform()
+        self.overlay = None
+
         # Selected zones
-        self.image = QImage()
         self.rectangles: list[MyRect] = []  # To store rectangle coordinates
         self.start_point = None  # Starting point for rectangle
         self.end_point = None  # End point for rectangle
@@ -21,17 +27,48 @@ class RectanglesLabelList(QLabel):
         self.scale_factor = 0
 
 
-    def set_image(self, image: QImage):
-        self.image = image
-        self.paint_rectangles(self.image)
+    def set_frame(self, frame, version, factor: float):
+        """
+        Show a BGR frame scaled by `factor`.
+
+        The frame is only read when its version or the scale changed, it is then drawn through
+        the scaling transform straight into the cached pixmap, without a scaled copy.
+        """
+        if version == self.frame_version and factor == self.scale_factor:
+            return
+        self.frame_version = version
+        self.scale_factor = factor
+        self.view_transform = QTransform.fromScale(factor, factor)
+
+        height, width, _ = frame.shape
+        view_size = QSize(int(width * factor), int(height * factor))
+        if self.frame_pixmap.size() != view_size:
+            self.frame_pixmap = QPixmap(view_size)
+            self.setFixedSize(view_size)
+
+        image = QImage(frame.data, width, height, 3 * width, QImage.Format.Format_BGR888)
+        painter = QPainter(self.frame_pixmap)
+        painter.setTransform(self.view_transform)
+        painter.drawImage(0, 0, image)
+        painter.end()
+
+    def set_overlay(self, overlay):
+        """Set the function painting over the frame, in frame coordinates."""
+        self.overlay = overlay
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.frame_pixmap)
 
-    def show_image(self):
-        pixmap = QPixmap.fromImage(self.image)
-        self.setFixedSize(self.image.width(), self.image.height())
-        self.setPixmap(pixmap)
+        # Overlays are drawn in frame coordinates
+        painter.setTransform(self.view_transform)
+        if self.overlay is not None:
+            self.overlay(painter)
+        self.paint_rectangles(painter)
 
-    def paint_rectangles(self, q_img):
-        painter = QPainter(q_img)
+        painter.end()
+
+    def paint_rectangles(self, painter):
         painter.setPen(QPen(QColor(255, 0, 0), 5))
         painter.setBrush(QColor(255, 0, 0, 90))
 
@@ -45,12 +82,6 @@ class RectanglesLabelList(QLabel):
                                    end.x() - start.x(),
                                    end.y() - start.y()))
 
-        painter.end()
-
-    def scale(self, factor: float):
-        self.scale_factor = factor
-        self.image = self.image.scaled(int(self.image.width() * factor), int(self.image.height() * factor))
-
     def get_rectangles(self):
         return self.rectangles
 
@@ -81,10 +112,9 @@ class RectanglesLabelList(QLabel):
             self.pop_last_rect()
 
     def get_mouse_position(self, event):
+        """Position of the mouse in frame coordinates."""
         mouse_pos = self.mapFromGlobal(event.globalPos())
-        mouse_pos.setX(mouse_pos.x() / self.scale_factor)
-        mouse_pos.setY(mouse_pos.y() / self.scale_factor)
-        return mouse_pos
+        return self.view_transform.inverted()[0].map(mouse_pos)
 
     def mousePressEvent(self, event):
         """Capture the starting point of the rectangle."""
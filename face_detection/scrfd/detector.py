@@ -3,7 +3,6 @@ import os.path as osp
 import cv2
 import numpy as np
 import onnxruntime
-import torch
 
 
 def softmax(z):
@@ -33,35 +32,30 @@ def distance2bbox(points, distance, max_shape=None):
     x2 = points[:, 0] + distance[:, 2]
     y2 = points[:, 1] + distance[:, 3]
     if max_shape is not None:
-        x1 = x1.clamp(min=0, max=max_shape[1])
-        y1 = y1.clamp(min=0, max=max_shape[0])
-        x2 = x2.clamp(min=0, max=max_shape[1])
-        y2 = y2.clamp(min=0, max=max_shape[0])
+        x1 = np.clip(x1, 0, max_shape[1])
+        y1 = np.clip(y1, 0, max_shape[0])
+        x2 = np.clip(x2, 0, max_shape[1])
+        y2 = np.clip(y2, 0, max_shape[0])
     return np.stack([x1, y1, x2, y2], axis=-1)
 
 
 def distance2kps(points, distance, max_shape=None):
-    """Decode distance prediction to bounding box.
+    """Decode distance prediction to keypoints.
 
     Args:
         points (Tensor): Shape (n, 2), [x, y].
-        distance (Tensor): Distance from the given point to 4
-            boundaries (left, top, right, bottom).
+        distance (Tensor): Shape (n, 2 * num_kps), offsets of every keypoint
+            from the given point.
         max_shape (tuple): Shape of the image.
 
     Returns:
-        Tensor: Decoded bboxes.
+        Tensor: Decoded keypoints, shape (n, 2 * num_kps).
     """
-    preds = []
-    for i in range(0, distance.shape[1], 2):
-        px = points[:, i % 2] + distance[:, i]
-        py = points[:, i % 2 + 1] + distance[:, i + 1]
-        if max_shape is not None:
-            px = px.clamp(min=0, max=max_shape[1])
-            py = py.clamp(min=0, max=max_shape[0])
-        preds.append(px)
-        preds.append(py)
-    return np.stack(preds, axis=-1)
+    preds = points[:, np.newaxis, :] + distance.reshape((distance.shape[0], distance.shape[1] // 2, 2))
+    if max_shape is not None:
+        preds[..., 0] = np.clip(preds[..., 0], 0, max_shape[1])
+        preds[..., 1] = np.clip(preds[..., 1], 0, max_shape[0])
+    return preds.reshape(distance.shape)
 
 
 class SCRFD:
@@ -70,14 +64,18 @@ class SCRFD:
         self.session = session
         self.taskname = "detection"
         self.batched = False
+        self.dynamic_batch = False
         if self.session is None:
             assert self.model_file is not None
             assert osp.exists(self.model_file)
             self.session = onnxruntime.InferenceSession(self.model_file, None)
         self.center_cache = {}
+        self.anchor_tables = {}
         self.nms_thresh = 0.4
 
         self._init_vars()
+        if self.input_size is not None:
+            self.get_anchor_centers(self.input_size[1], self.input_size[0])
 
     def _init_vars(self):
         input_cfg = self.session.get_inputs()[0]
@@ -90,6 +88,8 @@ class SCRFD:
         outputs = self.session.get_outputs()
         if len(outputs[0].shape) == 3:
             self.batched = True
+            # Several images can only be stacked when the batch axis is not fixed
+            self.dynamic_batch = not isinstance(input_shape[0], int)
         output_names = []
         for o in outputs:
             output_names.append(o.name)
@@ -128,66 +128,91 @@ class SCRFD:
                 print("warning: det_size is already set in scrfd model, ignore")
             else:
                 self.input_size = input_size
+                self.get_anchor_centers(input_size[1], input_size[0])
+
+    def get_anchor_centers(self, input_height, input_width):
+        """Anchor-center tables of every stride for one input size, built once and cached."""
+        key = (input_height, input_width)
+        if key in self.anchor_tables:
+            return self.anchor_tables[key]
+
+        tables = []
+        for stride in self._feat_stride_fpn:
+            height = input_height // stride
+            width = input_width // stride
+            center_key = (height, width, stride)
+            if center_key in self.center_cache:
+                anchor_centers = self.center_cache[center_key]
+            else:
+                anchor_centers = np.stack(
+                    np.mgrid[:height, :width][::-1], axis=-1
+                ).astype(np.float32)
+
+                anchor_centers = (anchor_centers * stride).reshape((-1, 2))
+                if self._num_anchors > 1:
+                    anchor_centers = np.stack(
+                        [anchor_centers] * self._num_anchors, axis=1
+                    ).reshape((-1, 2))
+                if len(self.center_cache) < 100:
+                    self.center_cache[center_key] = anchor_centers
+            tables.append(anchor_centers)
+
+        if len(self.anchor_tables) < 100:
+            self.anchor_tables[key] = tables
+        return tables
 
     def forward(self, img, thresh):
-        scores_list = []
-        bboxes_list = []
-        kpss_list = []
         input_size = tuple(img.shape[0:2][::-1])
         blob = cv2.dnn.blobFromImage(
             img, 1.0 / 128, input_size, (127.5, 127.5, 127.5), swapRB=True
         )
         net_outs = self.session.run(self.output_names, {self.input_name: blob})
 
-        input_height = blob.shape[2]
-        input_width = blob.shape[3]
+        return self.decode(net_outs, 0, blob.shape[2], blob.shape[3], thresh)
+
+    def forward_batch(self, imgs, thresh):
+        """Run all images (of the same size) through the model with a single session.run."""
+        input_size = tuple(imgs[0].shape[0:2][::-1])
+        blob = cv2.dnn.blobFromImages(
+            imgs, 1.0 / 128, input_size, (127.5, 127.5, 127.5), swapRB=True
+        )
+        net_outs = self.session.run(self.output_names, {self.input_name: blob})
+
+        return [
+            self.decode(net_outs, i, blob.shape[2], blob.shape[3], thresh)
+            for i in range(len(imgs))
+        ]
+
+    def decode(self, net_outs, batch_index, input_height, input_width, thresh):
+        scores_list = []
+        bboxes_list = []
+        kpss_list = []
         fmc = self.fmc
+        anchor_tables = self.get_anchor_centers(input_height, input_width)
         for idx, stride in enumerate(self._feat_stride_fpn):
-            # If model support batch dim, take first output
+            # If model support batch dim, take the output of the requested image
             if self.batched:
-                scores = net_outs[idx][0]
-                bbox_preds = net_outs[idx + fmc][0]
-                bbox_preds = bbox_preds * stride
+                scores = net_outs[idx][batch_index]
+                bbox_preds = net_outs[idx + fmc][batch_index]
                 if self.use_kps:
-                    kps_preds = net_outs[idx + fmc * 2][0] * stride
+                    kps_preds = net_outs[idx + fmc * 2][batch_index]
             # If model doesn't support batching take output as is
             else:
                 scores = net_outs[idx]
                 bbox_preds = net_outs[idx + fmc]
-                bbox_preds = bbox_preds * stride
                 if self.use_kps:
-                    kps_preds = net_outs[idx + fmc * 2] * stride
-
-            height = input_height // stride
-            width = input_width // stride
-            K = height * width
-            key = (height, width, stride)
-            if key in self.center_cache:
-                anchor_centers = self.center_cache[key]
-            else:
-                anchor_centers = np.stack(
-                    np.mgrid[:height, :width][::-1], axis=-1
-                ).astype(np.float32)
-
-                anchor_centers = (anchor_centers * stride).reshape((-1, 2))
-                if self._num_anchors > 1:
-                    anchor_centers = np.stack(
-                        [anchor_centers] * self._num_anchors, axis=1
-                    ).reshape((-1, 2))
-                if len(self.center_cache) < 100:
-                    self.center_cache[key] = anchor_centers
+                    kps_preds = net_outs[idx + fmc * 2]
 
+            # Only the anchors above the score threshold are decoded
             pos_inds = np.where(scores >= thresh)[0]
-            bboxes = distance2bbox(anchor_centers, bbox_preds)
+            pos_centers = anchor_tables[idx][pos_inds]
             pos_scores = scores[pos_inds]
-            pos_bboxes = bboxes[pos_inds]
+            pos_bboxes = distance2bbox(pos_centers, bbox_preds[pos_inds] * stride)
             scores_list.append(pos_scores)
             bboxes_list.append(pos_bboxes)
             if self.use_kps:
-                kpss = distance2kps(anchor_centers, kps_preds)
-                # kpss = kps_preds
-                kpss = kpss.reshape((kpss.shape[0], -1, 2))
-                pos_kpss = kpss[pos_inds]
+                pos_kpss = distance2kps(pos_centers, kps_preds[pos_inds] * stride)
+                pos_kpss = pos_kpss.reshape((pos_kpss.shape[0], pos_kpss.shape[1] // 2, 2))
                 kpss_list.append(pos_kpss)
         return scores_list, bboxes_list, kpss_list
 
@@ -307,24 +332,59 @@ class SCRFD:
     def detect_tracking(
             self, image, tlwhs=None, thresh=0.5, input_size=(128, 128), max_num=0, metric="default"
     ):
+        return self.detect_tracking_batch([image], [tlwhs], thresh, input_size, max_num, metric)[0]
+
+    def detect_tracking_batch(
+            self, images, tlwhs_list, thresh=0.5, input_size=(128, 128), max_num=0, metric="default"
+    ):
+        """
+        Run detect_tracking on several images (e.g. one frame per camera) at once.
+
+        The zones of all images are packed into a single batch when the model allows it.
+
+        Returns:
+            list: One (det, img_info, bboxes, landmarks) tuple per image, as detect_tracking returns.
+        """
         assert input_size is not None or self.input_size is not None
+        # A model exported with a fixed input shape can only run at that size
+        input_size = self.input_size if input_size is None or self.input_size is not None else input_size
+
+        images_tlwhs = []
+        zones = []
+        for image, tlwhs in zip(images, tlwhs_list):
+            if not tlwhs:
+                height, width = image.shape[:2]
+                tlwhs = [[0, 0, width, height]]
+            images_tlwhs.append(tlwhs)
+            zones.extend(self.get_resized_subimage(image, tlwh, input_size) for tlwh in tlwhs)
+
+        # Pack all zones into one batch when the model allows it, otherwise run them one by one
+        if self.dynamic_batch and len(zones) > 1:
+            zone_outs = self.forward_batch([det_img for det_img, _ in zones], thresh)
+        else:
+            zone_outs = [self.forward(det_img, thresh) for det_img, _ in zones]
+
+        results = []
+        start = 0
+        for image, tlwhs in zip(images, images_tlwhs):
+            end = start + len(tlwhs)
+            results.append(
+                self.merge_zone_detections(image, tlwhs, zones[start:end], zone_outs[start:end], max_num, metric)
+            )
+            start = end
+        return results
+
+    def merge_zone_detections(self, image, tlwhs, zones, zone_outs, max_num=0, metric="default"):
         height, width = image.shape[:2]
         img_info = {"id": 0}
         img_info["height"] = height
         img_info["width"] = width
         img_info["raw_img"] = image
 
-        if not tlwhs:
-            tlwhs = [[0, 0, width, height]]
-
-        input_size = self.input_size if input_size is None else input_size
-
         scores_list, bboxes_list, kpss_list = [], [], []
 
-        for tlwh in tlwhs:
+        for tlwh, (_, det_scale), (s, b, k) in zip(tlwhs, zones, zone_outs):
             x, y, w, h = tlwh
-            det_img, det_scale = self.get_resized_subimage(image, tlwh, input_size)
-            s, b, k = self.forward(det_img, thresh)
 
             offset = np.array([x, y, x, y])
             for i in range(len(b)):
@@ -384,4 +444,4 @@ class SCRFD:
         bboxes = np.int32(det)
         landmarks = np.int32(kpss)
 
-        return torch.tensor(det), img_info, bboxes, landmarks
+        return det, img_info, bboxes, landmarks
@@ -0,0 +1,76 @@
+"""
+Export ArcFace IResNet weights to ONNX with a dynamic batch axis.
+
+Run from the repository root:
+
+    python -m face_recognition.arcface.export_onnx --model-name r100 \
+        --weights face_recognition/arcface/weights/arcface_r100.pth \
+        --output face_recognition/arcface/weights/arcface_r100.onnx
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from face_recognition.arcface.model import IResNetEmbedder, iresnet_inference
+from face_recognition.arcface.onnx_model import ArcFaceONNX
+
+
+def export_onnx(model_name, weights, output, opset=17, atol=1e-3):
+    """
+    Export the model, then check the ONNX embeddings against PyTorch.
+
+    Args:
+        model_name (str): ArcFace backbone, "r18", "r34", "r50" or "r100".
+        weights (str): Path of the PyTorch weights.
+        output (str): Path of the ONNX model to write.
+        opset (int): ONNX opset version.
+        atol (float): Largest absolute embedding difference accepted.
+
+    Returns:
+        float: The largest absolute embedding difference.
+    """
+    device = torch.device("cpu")
+    model = iresnet_inference(model_name=model_name, path=weights, device=device)
+
+    torch.onnx.export(
+        model,
+        torch.zeros(1, 3, 112, 112),
+        output,
+        input_names=["input"],
+        output_names=["embedding"],
+        dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}},
+        opset_version=opset,
+        dynamo=False,
+    )
+
+    # Embeddings must match PyTorch, on another batch size than the exported one
+    batch = np.random.default_rng(0).uniform(-1, 1, (4, 3, 112, 112)).astype(np.float32)
+    expected = IResNetEmbedder(model, device)(batch)
+    embeddings = ArcFaceONNX(output)(batch)
+    max_diff = float(np.abs(expected - embeddings).max())
+    if max_diff > atol:
+        raise RuntimeError(f"ONNX embeddings differ from PyTorch by {max_diff:.2e} (> {atol:.0e})")
+    return max_diff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-name", type=str, default="r100", help="ArcFace backbone.")
+    parser.add_argument(
+        "--weights",
+        type=str,
+        default="face_recognition/arcface/weights/arcface_r100.pth",
+        help="Path to the ArcFace weights.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="face_recognition/arcface/weights/arcface_r100.onnx",
+        help="Path of the ONNX model to write.",
+    )
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version.")
+    opt = parser.parse_args()
+
+    max_diff = export_onnx(opt.model_name, opt.weights, opt.output, opset=opt.opset)
+    print(f"Exported {opt.output}, max embedding difference with PyTorch {max_diff:.2e}")
@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+# The legacy feature.npz files were always enrolled with the r100 backbone
+LEGACY_BACKBONE = "r100"
+
+
+class FeatureStore:
+    """
+    Append-only, memory-mappable store of enrolled face embeddings.
+
+    The store is a directory with float32 embedding shards (`<shard>.emb.npy`),
+    one name table per shard (`<shard>.names.npy`) and a small manifest listing
+    the shards. Adding people writes a new shard and rewrites only the manifest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def load_manifest(self):
+        if not self.exists():
+            return {"version": 1, "generation": 0, "metadata": {}, "shards": []}
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        # Write then rename so readers never see a half written manifest
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def backbone(self):
+        """ArcFace backbone the embeddings come from, None if the store is empty."""
+        manifest = self.load_manifest()
+        if not manifest["shards"]:
+            return None
+        # Stores imported before the backbone was recorded hold legacy embeddings
+        return manifest["metadata"].get("backbone", LEGACY_BACKBONE)
+
+    def check_backbone(self, backbone):
+        """Refuse to compare or mix embeddings of another backbone with the stored ones."""
+        stored = self.backbone()
+        if stored is not None and stored != backbone:
+            raise ValueError(
+                f"{self.path} holds {stored} embeddings, they cannot be mixed with {backbone} ones; "
+                f"enroll again into a new store"
+            )
+
+    def fingerprint(self):
+        return f"store-{self.load_manifest()['generation']}"
+
+    def __len__(self):
+        return sum(shard["rows"] for shard in self.load_manifest()["shards"])
+
+    def _write_shard(self, shard_name, names, embeddings):
+        np.save(os.path.join(self.path, f"{shard_name}.emb.npy"), embeddings)
+        np.save(os.path.join(self.path, f"{shard_name}.names.npy"), names)
+
+    def _read_shard(self, shard_name):
+        embeddings = np.load(os.path.join(self.path, f"{shard_name}.emb.npy"), mmap_mode="r")
+        names = np.load(os.path.join(self.path, f"{shard_name}.names.npy"))
+        return names, embeddings
+
+    def append(self, names, embeddings, backbone):
+        """
+        Add embeddings as a new shard.
+
+        Args:
+            names: Name of every new embedding.
+            embeddings: The new L2-normalized embeddings, N x D.
+            backbone (str): ArcFace backbone of the embeddings, recorded in the manifest.
+
+        Returns:
+            str: The name of the new shard.
+        """
+        names = np.asarray(names, dtype=str)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(names), -1)
+
+        self.check_backbone(backbone)
+
+        os.makedirs(self.path, exist_ok=True)
+        manifest = self.load_manifest()
+        manifest["metadata"]["backbone"] = backbone
+        manifest["generation"] += 1
+        shard_name = f"shard_{manifest['generation']:05d}"
+
+        self._write_shard(shard_name, names, embeddings)
+        manifest["shards"].append({"name": shard_name, "rows": len(names)})
+        self.save_manifest(manifest)
+        return shard_name
+
+    def read(self):
+        """
+        Map the store into memory.
+
+        A single shard is returned as a read-only memory map without any copy,
+        several shards are concatenated (run `compact` to get back to one).
+
+        Returns:
+            tuple: The names and the embeddings, None if the store is empty.
+        """
+        shards = self.load_manifest()["shards"]
+        if not shards:
+            return None
+
+        parts = [self._read_shard(shard["name"]) for shard in shards]
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([names for names, _ in parts]), np.concatenate([embs for _, embs in parts])
+
+    def compact(self):
+        """Merge all shards into one, offline."""
+        if len(self.load_manifest()["shards"]) <= 1:
+            return
+
+        names, embeddings = self.read()
+        self._replace_shards(names, embeddings)
+
+    def prune(self, thresh):
+        """
+        Drop near-duplicate embeddings of every person, offline.
+
+        Args:
+            thresh (float): Cosine similarity above which two embeddings of a person are duplicates.
+
+        Returns:
+            int: Number of pruned embeddings.
+        """
+        data = self.read()
+        if data is None:
+            return 0
+
+        names, embeddings = data
+        keep = near_duplicate_mask(names, embeddings, thresh)
+        if keep.all():
+            return 0
+
+        self._replace_shards(names[keep], embeddings[keep])
+        return int((~keep).sum())
+
+    def _replace_shards(self, names, embeddings):
+        # Write the new shard and the manifest before removing anything
+        manifest = self.load_manifest()
+        old_shards = manifest["shards"]
+        manifest["generation"] += 1
+        shard_name = f"shard_{manifest['generation']:05d}"
+        self._write_shard(shard_name, names, np.ascontiguousarray(embeddings))
+        manifest["shards"] = [{"name": shard_name, "rows": len(names)}]
+        self.save_manifest(manifest)
+
+        for shard in old_shards:
+            for suffix in (".emb.npy", ".names.npy"):
+                os.remove(os.path.join(self.path, shard["name"] + suffix))
+
+    def import_npz(self, npz_path):
+        """Add the content of a legacy feature.npz file as a shard of r100 embeddings."""
+        data = np.load(npz_path, allow_pickle=True)
+        return self.append(data["images_name"], data["images_emb"], backbone=LEGACY_BACKBONE)
+
+
+def check_features_backbone(feature_path, backbone):
+    """
+    Refuse to use the features at `feature_path` with embeddings of another backbone.
+
+    Args:
+        feature_path (str): Path of the features without extension, the store or the legacy .npz file.
+        backbone (str): ArcFace backbone of the embeddings to compare or add.
+    """
+    store = FeatureStore(store_path(feature_path))
+    if store.exists():
+        store.check_backbone(backbone)
+    elif os.path.exists(feature_path + ".npz") and backbone != LEGACY_BACKBONE:
+        raise ValueError(
+            f"{feature_path}.npz holds {LEGACY_BACKBONE} embeddings, they cannot be mixed with {backbone} ones; "
+            f"enroll again into a new store"
+        )
+
+
+def group_rows(names):
+    """
+    Group row indices by name with a single sort.
+
+    Args:
+        names: Name of every row.
+
+    Returns:
+        dict: Increasing row indices of every name, names in sorted order.
+    """
+    names = np.asarray(names)
+    order = np.argsort(names, kind="stable")
+    unique, starts = np.unique(names[order], return_index=True)
+    return dict(zip(unique, np.split(order, starts[1:])))
+
+
+def near_duplicate_mask(names, embeddings, thresh, known_names=None, known_embeddings=None):
+    """
+    Find near-duplicate embeddings, such as burst shots of one person.
+
+    An embedding is dropped when its cosine similarity to a known embedding or
+    to an earlier kept embedding of the same person is above `thresh`.
+
+    Args:
+        names: Name of every embedding.
+        embeddings: L2-normalized embeddings, N x D.
+        thresh (float): Cosine similarity above which two embeddings are duplicates.
+        known_names: Names of the embeddings already enrolled, if any.
+        known_embeddings: The embeddings already enrolled, M x D.
+
+    Returns:
+        numpy.ndarray: Boolean mask of the embeddings to keep.
+    """
+    keep = np.ones(len(names), dtype=bool)
+    known_rows = group_rows(known_names) if known_names is not None else {}
+    for name, rows in group_rows(names).items():
+        person_embeddings = np.asarray(embeddings[rows], dtype=np.float32)
+
+        person_keep = np.ones(len(rows), dtype=bool)
+        if name in known_rows:
+            known = np.asarray(known_embeddings[known_rows[name]], dtype=np.float32)
+            person_keep = (person_embeddings @ known.T).max(axis=1) <= thresh
+
+        # One similarity matrix per person. An embedding is dropped when an earlier kept one is
+        # a duplicate, iterating to the fixed point settles at least one more row per pass
+        duplicates = np.triu(person_embeddings @ person_embeddings.T > thresh, 1)
+        candidates = person_keep
+        while True:
+            kept = candidates & ~(duplicates & person_keep[:, np.newaxis]).any(axis=0)
+            if np.array_equal(kept, person_keep):
+                break
+            person_keep = kept
+        keep[rows] = person_keep
+    return keep
+
+
+def store_path(feature_path):
+    """Directory of the feature store that replaces `<feature_path>.npz`."""
+    return feature_path + ".store"
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "command", choices=["compact", "import", "info", "prune"], help="Operation on the feature store."
+    )
+    parser.add_argument(
+        "--features-path",
+        type=str,
+        default="./datasets/face_features/feature",
+        help="Path of the face features, the store lives in <path>.store.",
+    )
+    parser.add_argument(
+        "--dedup-thresh",
+        type=float,
+        default=0.95,
+        help="Cosine similarity above which two embeddings of a person are pruned by `prune`.",
+    )
+    opt = parser.parse_args()
+
+    store = FeatureStore(store_path(opt.features_path))
+    if opt.command == "compact":
+        store.compact()
+    elif opt.command == "import":
+        store.import_npz(opt.features_path + ".npz")
+    elif opt.command == "prune" and not store.exists() and os.path.exists(opt.features_path + ".npz"):
+        # No store yet, prune the legacy .npz file in place
+        data = np.load(opt.features_path + ".npz", allow_pickle=True)
+        images_name, images_emb = data["images_name"], data["images_emb"]
+        keep = near_duplicate_mask(images_name, images_emb, opt.dedup_thresh)
+        np.savez_compressed(opt.features_path, images_name=images_name[keep], images_emb=images_emb[keep])
+        print(f"Pruned {int((~keep).sum())} near-duplicate embeddings from {opt.features_path}.npz")
+    elif opt.command == "prune":
+        print(f"Pruned {store.prune(opt.dedup_thresh)} near-duplicate embeddings")
+
+    manifest = store.load_manifest()
+    print(
+        f"{len(store)} embeddings in {len(manifest['shards'])} shard(s), generation {manifest['generation']}, "
+        f"backbone {store.backbone() or 'none'}"
+    )
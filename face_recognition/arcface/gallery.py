@@ -0,0 +1,312 @@
+import os
+
+import numpy as np
+
+from face_recognition.arcface.feature_store import FeatureStore, group_rows, store_path
+from face_recognition.arcface.utils import read_features
+
+
+def top_k(sims, k):
+    """Indices and values of the k largest similarities of every row, best first."""
+    if k == 1:
+        # argmax keeps the first best hit, exactly like compare_encodings
+        indices = np.argmax(sims, axis=1)[:, np.newaxis]
+    else:
+        k = min(k, sims.shape[1])
+        indices = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(sims, indices, axis=1), axis=1, kind="stable")
+        indices = np.take_along_axis(indices, order, axis=1)
+    return np.take_along_axis(sims, indices, axis=1), indices
+
+
+class ExactIndex:
+    """Brute force cosine search, one BLAS matmul per chunk of the gallery."""
+
+    kind = "exact"
+
+    def __init__(self, embeddings, dtype="float32", chunk_size=65536):
+        # A float32 memory map of the feature store is searched in place, without a copy
+        self.embeddings = np.asarray(embeddings, dtype=dtype)
+        self.chunk_size = chunk_size
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.embeddings.dtype == np.float32:
+            sims = queries @ self.embeddings.T
+        else:
+            # float16 halves the gallery memory, chunks are upcast so the matmul still runs in BLAS
+            sims = np.empty((len(queries), len(self.embeddings)), dtype=np.float32)
+            for start in range(0, len(self.embeddings), self.chunk_size):
+                chunk = self.embeddings[start:start + self.chunk_size].astype(np.float32)
+                sims[:, start:start + self.chunk_size] = queries @ chunk.T
+        return top_k(sims, k)
+
+    def state(self):
+        return {}
+
+    @classmethod
+    def from_state(cls, state, embeddings, **options):
+        return cls(embeddings, **options)
+
+
+class IVFIndex:
+    """
+    Approximate cosine search with an inverted file.
+
+    The gallery is clustered with spherical k-means, a query only scans the
+    embeddings of its n_probe closest clusters.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, embeddings, n_lists=0, n_probe=16, iterations=10, seed=0):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(embeddings))))
+        n_lists = min(n_lists, len(embeddings))
+        self.n_probe = n_probe
+
+        # Spherical k-means
+        rng = np.random.default_rng(seed)
+        centroids = embeddings[rng.choice(len(embeddings), n_lists, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(embeddings @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, embeddings)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            sums[empty] = embeddings[rng.choice(len(embeddings), int(empty.sum()), replace=False)]
+            centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+        assign = np.argmax(embeddings @ centroids.T, axis=1)
+
+        # Gallery rows grouped by list, the embeddings themselves stay where they are
+        self.ids = np.argsort(assign, kind="stable")
+        self.embeddings = embeddings
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists))))
+        self.centroids = centroids
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32)
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        for q, lists in enumerate(probes):
+            candidates = self.ids[np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])]
+            sims = self.embeddings[candidates] @ queries[q]
+            best_scores, best = top_k(sims[np.newaxis, :], k)
+            scores[q, :best.shape[1]] = best_scores[0]
+            indices[q, :best.shape[1]] = candidates[best[0]]
+        return scores, indices
+
+    def state(self):
+        return {
+            "ids": self.ids,
+            "offsets": self.offsets,
+            "centroids": self.centroids,
+            "n_probe": np.array(self.n_probe),
+        }
+
+    @classmethod
+    def from_state(cls, state, embeddings, **options):
+        index = cls.__new__(cls)
+        index.embeddings = np.asarray(embeddings, dtype=np.float32)
+        index.ids = state["ids"]
+        index.offsets = state["offsets"]
+        index.centroids = state["centroids"]
+        index.n_probe = int(state["n_probe"])
+        return index
+
+
+BACKENDS = {ExactIndex.kind: ExactIndex, IVFIndex.kind: IVFIndex}
+
+
+def k_center(embeddings, k, first=0):
+    """Greedy k-center selection: repeatedly add the embedding farthest from the ones already chosen."""
+    chosen = [first]
+    max_sims = embeddings @ embeddings[first]
+    while len(chosen) < min(k, len(embeddings)):
+        candidate = int(np.argmin(max_sims))
+        chosen.append(candidate)
+        max_sims = np.maximum(max_sims, embeddings @ embeddings[candidate])
+    return chosen
+
+
+def aggregate_gallery(names, embeddings, max_exemplars=8, outlier_z=2.0):
+    """
+    Reduce every identity to its centroid plus a capped set of diverse exemplars.
+
+    Exemplars much less similar to their centroid than the rest of the identity
+    (more than outlier_z standard deviations) are dropped as noise before the
+    k-center selection, so they cannot cause false matches.
+
+    Args:
+        names (numpy.ndarray): Name of every enrolled embedding.
+        embeddings (numpy.ndarray): L2-normalized enrolled embeddings.
+        max_exemplars (int): Maximum number of exemplars kept per identity, besides the centroid.
+        outlier_z (float): Outlier threshold in standard deviations, 0 keeps all exemplars.
+
+    Returns:
+        tuple: The reduced names and embeddings.
+    """
+    names = np.asarray(names)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    reduced_names = []
+    reduced_embs = []
+    for name, rows in group_rows(names).items():
+        person_embs = embeddings[rows]
+        centroid = person_embs.mean(axis=0)
+        centroid /= np.linalg.norm(centroid)
+
+        centroid_sims = person_embs @ centroid
+        if outlier_z > 0 and len(person_embs) > 2:
+            inliers = centroid_sims >= centroid_sims.mean() - outlier_z * centroid_sims.std()
+            person_embs = person_embs[inliers]
+            centroid_sims = centroid_sims[inliers]
+
+        if len(person_embs) == 1:
+            # The centroid already is the only exemplar
+            exemplars = person_embs[:0]
+        else:
+            # Start from the most typical exemplar, then spread out
+            exemplars = person_embs[k_center(person_embs, max_exemplars, first=int(np.argmax(centroid_sims)))]
+
+        reduced_embs.append(centroid[np.newaxis, :])
+        reduced_embs.append(exemplars)
+        reduced_names.extend([name] * (1 + len(exemplars)))
+
+    return np.array(reduced_names), np.vstack(reduced_embs)
+
+
+class GalleryIndex:
+    """
+    Enrolled names with a pluggable nearest-neighbor backend.
+
+    Only the state derived by the backend is persisted, the names and embeddings are read
+    back from the features, except for aggregated galleries that cannot be rebuilt cheaply.
+    """
+
+    def __init__(self, names, index, fingerprint="", aggregated=False):
+        self.names = np.asarray(names)
+        self.index = index
+        self.fingerprint = fingerprint
+        self.aggregated = aggregated
+
+    @classmethod
+    def build(cls, names, embeddings, backend="exact", fingerprint="", aggregated=False, **options):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown gallery backend {backend}, expected one of {list(BACKENDS)}")
+        return cls(names, BACKENDS[backend](embeddings, **options), fingerprint, aggregated)
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, queries, k=1):
+        """
+        Find the k most similar enrolled embeddings of every query.
+
+        Args:
+            queries (numpy.ndarray): L2-normalized query embeddings, N x 512.
+            k (int): Number of hits per query.
+
+        Returns:
+            tuple: Scores, names and gallery indices of the hits, each N x k, best first.
+        """
+        scores, indices = self.index.search(queries, k)
+        names = np.where(indices >= 0, self.names[np.maximum(indices, 0)], None)
+        return scores, names, indices
+
+    def save(self, path):
+        state = self.index.state()
+        if self.aggregated:
+            state.update(names=self.names, embeddings=self.index.embeddings)
+        np.savez(
+            path,
+            kind=np.array(self.index.kind),
+            fingerprint=np.array(self.fingerprint),
+            aggregated=np.array(self.aggregated),
+            **state,
+        )
+
+    @staticmethod
+    def load_state(path):
+        with np.load(path, allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+
+    @classmethod
+    def from_state(cls, state, names=None, embeddings=None, **options):
+        """
+        Restore a saved gallery.
+
+        Args:
+            state (dict): The arrays read by `load_state`.
+            names: The enrolled names, ignored for an aggregated gallery.
+            embeddings: The enrolled embeddings, ignored for an aggregated gallery.
+            **options: The backend options the gallery was built with.
+
+        Returns:
+            GalleryIndex: The gallery index.
+        """
+        aggregated = bool(state["aggregated"])
+        if aggregated:
+            names, embeddings = state["names"], state["embeddings"]
+        index = BACKENDS[str(state["kind"])].from_state(state, embeddings, **options)
+        return cls(names, index, str(state["fingerprint"]), aggregated)
+
+
+def features_fingerprint(feature_path):
+    store = FeatureStore(store_path(feature_path))
+    if store.exists():
+        return store.fingerprint()
+    stat = os.stat(feature_path + ".npz")
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def load_gallery_index(feature_path, backend="exact", max_exemplars=0, **options):
+    """
+    Load the gallery index persisted next to the features, rebuilding it only when the features changed.
+
+    Args:
+        feature_path (str): Path of the features without extension, as for read_features.
+        backend (str): "exact" or "ivf".
+        max_exemplars (int): If positive, index every identity as its centroid plus at most
+            this many exemplars (see aggregate_gallery) instead of every enrolled embedding.
+        **options: Backend options (dtype for exact, n_lists/n_probe for ivf).
+
+    Returns:
+        GalleryIndex: The gallery index.
+    """
+    index_path = f"{feature_path}.{backend}.index.npz"
+    # Any change of the features, the aggregation, the backend or its options rebuilds the index
+    options_key = ",".join(f"{key}={options[key]}" for key in sorted(options))
+    fingerprint = f"{features_fingerprint(feature_path)}-{max_exemplars}-{backend}-{options_key}"
+
+    state = None
+    if os.path.exists(index_path):
+        try:
+            state = GalleryIndex.load_state(index_path)
+            if str(state["fingerprint"]) != fingerprint:
+                state = None
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Rebuilding unreadable gallery index {index_path}: {e}")
+            state = None
+
+    if state is not None and bool(state["aggregated"]):
+        return GalleryIndex.from_state(state, **options)
+
+    # Memory map of the feature store, the exact backend searches it without a copy
+    features = read_features(feature_path)
+    if features is None:
+        raise FileNotFoundError(f"No face features found at {feature_path}")
+    images_names, images_embs = features
+    if state is not None:
+        return GalleryIndex.from_state(state, images_names, images_embs, **options)
+
+    aggregated = max_exemplars > 0
+    if aggregated:
+        images_names, images_embs = aggregate_gallery(images_names, images_embs, max_exemplars)
+
+    gallery = GalleryIndex.build(images_names, images_embs, backend, fingerprint, aggregated, **options)
+    gallery.save(index_path)
+    return gallery
@@ -1,3 +1,5 @@
+import warnings
+
 import torch
 import torch.nn.functional as F
 from torch import nn
@@ -22,6 +24,67 @@ def conv1x1(in_planes, out_planes, stride=1):
     return nn.Conv2d(in_planes, out_planes, kernel_size=1, stride=stride, bias=False)
 
 
+def bn_scale_shift(bn):
+    """BatchNorm at inference time as a per-channel x * scale + shift."""
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    return scale, bn.bias - bn.running_mean * scale
+
+
+def fuse_conv_and_bn(conv, bn):
+    """Fold a BatchNorm2d into the Conv2d right before it."""
+    fusedconv = (
+        nn.Conv2d(
+            conv.in_channels,
+            conv.out_channels,
+            kernel_size=conv.kernel_size,
+            stride=conv.stride,
+            padding=conv.padding,
+            dilation=conv.dilation,
+            groups=conv.groups,
+            bias=True,
+        )
+        .requires_grad_(False)
+        .to(conv.weight.device)
+    )
+
+    scale, shift = bn_scale_shift(bn)
+    fusedconv.weight.copy_(conv.weight * scale.view(-1, 1, 1, 1))
+    b_conv = torch.zeros_like(scale) if conv.bias is None else conv.bias
+    fusedconv.bias.copy_(b_conv * scale + shift)
+    return fusedconv
+
+
+def fuse_bn_linear_bn(bn_in, linear, bn_out, spatial_size):
+    """
+    Fold the BatchNorm2d before a flatten + Linear and the BatchNorm1d after it into the Linear.
+
+    Args:
+        bn_in: BatchNorm2d applied to the C x H x W input before it is flattened.
+        linear: Linear layer taking the flattened C * H * W input.
+        bn_out: BatchNorm1d applied to the output of the Linear layer.
+        spatial_size (int): H * W, every channel appears that many times in the flattened input.
+    """
+    fusedlinear = (
+        nn.Linear(linear.in_features, linear.out_features, bias=True)
+        .requires_grad_(False)
+        .to(linear.weight.device)
+    )
+
+    # Input side: the flattened input is channel major, repeat every channel H * W times
+    scale_in, shift_in = bn_scale_shift(bn_in)
+    scale_in = scale_in.repeat_interleave(spatial_size)
+    shift_in = shift_in.repeat_interleave(spatial_size)
+    weight = linear.weight * scale_in.view(1, -1)
+    b_linear = torch.zeros(linear.out_features, device=linear.weight.device) if linear.bias is None else linear.bias
+    bias = b_linear + linear.weight @ shift_in
+
+    # Output side
+    scale_out, shift_out = bn_scale_shift(bn_out)
+    fusedlinear.weight.copy_(weight * scale_out.view(-1, 1))
+    fusedlinear.bias.copy_(bias * scale_out + shift_out)
+    return fusedlinear
+
+
 class IBasicBlock(nn.Module):
     expansion = 1
 
@@ -71,6 +134,17 @@ class IBasicBlock(nn.Module):
         out += identity
         return out
 
+    @torch.no_grad()
+    def fuse(self):
+        # bn1 stays: it runs before a zero-padded conv, folding it would change the borders
+        self.conv1 = fuse_conv_and_bn(self.conv1, self.bn2)
+        self.bn2 = nn.Identity()
+        self.conv2 = fuse_conv_and_bn(self.conv2, self.bn3)
+        self.bn3 = nn.Identity()
+        if self.downsample is not None:
+            self.downsample = fuse_conv_and_bn(self.downsample[0], self.downsample[1])
+        return self
+
 
 class IResNet(nn.Module):
     fc_scale = 7 * 7
@@ -205,6 +279,18 @@ class IResNet(nn.Module):
         x = F.normalize(x, dim=1)
         return x
 
+    @torch.no_grad()
+    def fuse(self):  # fuse Conv2d() + BatchNorm2d() and BatchNorm + Linear() + BatchNorm1d() layers
+        self.conv1 = fuse_conv_and_bn(self.conv1, self.bn1)
+        self.bn1 = nn.Identity()
+        for m in self.modules():
+            if isinstance(m, IBasicBlock):
+                m.fuse()
+        self.fc = fuse_bn_linear_bn(self.bn2, self.fc, self.features, self.fc_scale)
+        self.bn2 = nn.Identity()
+        self.features = nn.Identity()
+        return self
+
 
 def _iresnet(arch, block, layers, pretrained, progress, **kwargs):
     model = IResNet(block, layers, **kwargs)
@@ -233,7 +319,30 @@ def iresnet200(pretrained=False, progress=True, **kwargs):
     return _iresnet("iresnet200", IBasicBlock, [6, 26, 60, 6], pretrained, progress, **kwargs)
 
 
-def iresnet_inference(model_name, path, device="cuda"):
+@torch.no_grad()
+def optimize_iresnet(model, device):
+    """
+    Fold the BatchNorm layers of an IResNet, then trace and freeze the inference graph.
+
+    `python -m benchmarks.fused_iresnet` checks the folded model against the original one.
+
+    Args:
+        model (IResNet): The model in eval mode, it is fused in place.
+        device: Device of the model.
+
+    Returns:
+        torch.jit.ScriptModule: The frozen model.
+    """
+    example = torch.rand(1, 3, 112, 112, device=device) * 2 - 1
+
+    model.fuse()
+    with warnings.catch_warnings():
+        # TorchScript is deprecated in favor of torch.compile, which is much slower to start
+        warnings.filterwarnings("ignore", message=r"`torch\.jit\.\w+` is deprecated", category=FutureWarning)
+        return torch.jit.freeze(torch.jit.trace(model, example))
+
+
+def iresnet_inference(model_name, path, device="cuda", optimize=False):
     if model_name == "r18":
         model = iresnet18()
     elif model_name == "r34":
@@ -249,5 +358,20 @@ def iresnet_inference(model_name, path, device="cuda"):
 
     model.load_state_dict(weight)
     model.to(device)
+    model.eval()
+
+    if optimize:
+        return optimize_iresnet(model, device)
+    return model
+
+
+class IResNetEmbedder:
+    """Run an IResNet on numpy batches, the same interface as `ArcFaceONNX`."""
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
 
-    return model.eval()
+    @torch.no_grad()
+    def __call__(self, batch):
+        return self.model(torch.from_numpy(batch).to(self.device)).cpu().numpy()
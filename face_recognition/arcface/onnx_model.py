@@ -0,0 +1,50 @@
+import onnxruntime
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+class ArcFaceONNX:
+    """
+    ArcFace recognizer running an exported IResNet with onnxruntime, torch is not needed.
+
+    Takes the N x 3 x 112 x 112 float32 batches built by `FacePreprocessor` and
+    returns the N x 512 embeddings, like `IResNetEmbedder` does for the torch model.
+    """
+
+    def __init__(
+        self,
+        model_file,
+        intra_op_num_threads=0,
+        inter_op_num_threads=0,
+        graph_optimization_level="all",
+        providers=None,
+    ):
+        """
+        Args:
+            model_file (str): Path of the model written by `python -m face_recognition.arcface.export_onnx`.
+            intra_op_num_threads (int): Threads used inside an operator, 0 uses every core.
+            inter_op_num_threads (int): Threads running independent operators, more than 1 enables parallel execution.
+            graph_optimization_level (str): One of "disable", "basic", "extended" and "all".
+            providers (list): onnxruntime execution providers, CPU by default.
+        """
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_num_threads
+        options.inter_op_num_threads = inter_op_num_threads
+        if inter_op_num_threads > 1:
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level]
+
+        self.model_file = model_file
+        self.session = onnxruntime.InferenceSession(
+            model_file, options, providers=providers or ["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [self.session.get_outputs()[0].name]
+
+    def __call__(self, batch):
+        return self.session.run(self.output_names, {self.input_name: batch})[0]
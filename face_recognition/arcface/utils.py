@@ -1,7 +1,17 @@
+import os
+
+import cv2
 import numpy as np
 
+from face_recognition.arcface.feature_store import FeatureStore, store_path
+
 
 def read_features(feature_path):
+    # The append-only store replaces the single .npz file once it exists
+    store = FeatureStore(store_path(feature_path))
+    if store.exists():
+        return store.read()
+
     try:
         data = np.load(feature_path + ".npz", allow_pickle=True)
         images_name = data["images_name"]
@@ -12,8 +22,93 @@ def read_features(feature_path):
         return None
 
 
+def load_images(images_dir, limit=0, seed=0):
+    """
+    Read the images of every person sub directory.
+
+    Args:
+        images_dir (str): Directory with one sub directory per person.
+        limit (int): Keep a random subset of this many images, 0 keeps them all.
+        seed (int): Seed of the random subset.
+
+    Returns:
+        tuple: The images and the name of the person of every image.
+    """
+    paths = []
+    for name_person in sorted(os.listdir(images_dir)):
+        person_dir = os.path.join(images_dir, name_person)
+        for image_name in sorted(os.listdir(person_dir)):
+            if image_name.endswith(("png", "jpg", "jpeg")):
+                paths.append((name_person, os.path.join(person_dir, image_name)))
+
+    if 0 < limit < len(paths):
+        keep = np.random.default_rng(seed).choice(len(paths), limit, replace=False)
+        paths = [paths[i] for i in sorted(keep)]
+
+    images, names = [], []
+    for name_person, path in paths:
+        image = cv2.imread(path)
+        if image is not None:
+            images.append(image)
+            names.append(name_person)
+    return images, np.array(names)
+
+
 def compare_encodings(encoding, encodings):
     sims = np.dot(encodings, encoding.T)
     pare_index = np.argmax(sims)
     score = sims[pare_index]
     return score, pare_index
+
+
+def batch_compare_encodings(encodings_query, encodings):
+    sims = np.dot(encodings_query, encodings.T)
+    pare_indices = np.argmax(sims, axis=1)
+    scores = sims[np.arange(len(pare_indices)), pare_indices]
+    return scores, pare_indices
+
+
+class FacePreprocessor:
+    """
+    Turn BGR uint8 face crops into the normalized N x 3 x H x W float32 batch ArcFace expects.
+
+    The BGR to RGB swap, the HWC to CHW transpose and the (x / 255 - 0.5) / 0.5
+    normalization are done while copying into a buffer that is reused across
+    calls, so the returned batch is only valid until the next call.
+    """
+
+    def __init__(self, image_size=112):
+        self.image_size = image_size
+        self.buffer = np.empty((0, 3, image_size, image_size), dtype=np.float32)
+
+    def __call__(self, face_images):
+        """
+        Preprocess one face or a batch of faces.
+
+        Args:
+            face_images: A H x W x 3 face, a list of faces or an N x H x W x 3 array.
+
+        Returns:
+            numpy.ndarray: The N x 3 x H x W batch, a view of the reused buffer.
+        """
+        size = self.image_size
+        if isinstance(face_images, np.ndarray) and face_images.ndim == 3:
+            face_images = face_images[np.newaxis]
+
+        n = len(face_images)
+        if len(self.buffer) < n:
+            self.buffer = np.empty((n, 3, size, size), dtype=np.float32)
+        batch = self.buffer[:n]
+
+        if isinstance(face_images, np.ndarray) and face_images.shape[1:3] == (size, size):
+            # Already one aligned array, a single strided copy
+            np.copyto(batch, face_images[..., ::-1].transpose(0, 3, 1, 2))
+        else:
+            for i, face_image in enumerate(face_images):
+                if face_image.shape[:2] != (size, size):
+                    face_image = cv2.resize(face_image, (size, size))
+                np.copyto(batch[i], face_image[..., ::-1].transpose(2, 0, 1))
+
+        batch *= 2.0 / 255.0
+        batch -= 1.0
+        return batch
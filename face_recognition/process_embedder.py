@@ -0,0 +1,196 @@
+import collections
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from face_recognition.arcface.utils import FacePreprocessor
+
+FACE_SHAPE = (112, 112, 3)
+
+
+class EmbeddingRing:
+    """
+    Shared-memory slots holding a batch of aligned crops and, once computed, their embeddings.
+
+    Every slot has room for `max_batch` 112x112 BGR crops, as many embeddings and a status
+    word: the number of embeddings written by the worker, or -1 if the worker failed.
+    """
+
+    def __init__(self, slots, max_batch, embedding_size, name=None):
+        self.slots = slots
+        self.max_batch = max_batch
+        self.embedding_size = embedding_size
+
+        crops_size = slots * max_batch * int(np.prod(FACE_SHAPE))
+        embeddings_size = slots * max_batch * embedding_size * 4
+        size = crops_size + embeddings_size + slots * 4
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.crops = np.ndarray((slots, max_batch, *FACE_SHAPE), np.uint8, self.shm.buf)
+        self.embeddings = np.ndarray((slots, max_batch, embedding_size), np.float32, self.shm.buf, crops_size)
+        self.status = np.ndarray((slots,), np.int32, self.shm.buf, crops_size + embeddings_size)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self, unlink=False):
+        # The views must go before the buffer can be released
+        del self.crops, self.embeddings, self.status
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def embedding_worker(loader, recognition_config, ring_args, requests, ready, done):
+    """
+    Embed the crops of the slots named on `requests` until a None arrives.
+
+    Args:
+        loader: Function building (device, recognizer) from the recognition config.
+        recognition_config (dict): The recognition config.
+        ring_args (tuple): (slots, max_batch, embedding_size, name) of the shared ring.
+        requests: Queue of (slot, count) requests.
+        ready: Queue receiving None once the model is loaded, or the loading error.
+        done (list): One semaphore per slot, released when the slot holds its embeddings.
+    """
+    try:
+        _, recognizer = loader(recognition_config)
+        ring = EmbeddingRing(*ring_args)
+        preprocess = FacePreprocessor()
+    except Exception as e:
+        ready.put(repr(e))
+        return
+    ready.put(None)
+
+    while (request := requests.get()) is not None:
+        slot, count = request
+        try:
+            ring.embeddings[slot, :count] = recognizer(preprocess(ring.crops[slot, :count]))
+            ring.status[slot] = count
+        except Exception:
+            ring.status[slot] = -1
+        done[slot].release()
+
+    ring.close()
+
+
+class ProcessEmbedder:
+    """
+    Run the ArcFace recognizer in worker processes, out of reach of the tracking thread's GIL.
+
+    Aligned crops are copied into a free slot of a shared-memory ring and only the slot
+    index goes through the request queue; the worker writes the embeddings back into the
+    same slot. Batches larger than a slot are split over several slots, so several
+    processes work on them at the same time. Safe to call from several threads.
+    """
+
+    def __init__(self, loader, recognition_config, processes=1, slots=4, max_batch=16, embedding_size=512):
+        """
+        Args:
+            loader: Picklable function building (device, recognizer) from the recognition config.
+            recognition_config (dict): The recognition config, passed to `loader` in every worker.
+            processes (int): Number of worker processes.
+            slots (int): Number of slots of the ring, at least `processes` to keep every worker busy.
+            max_batch (int): Number of crops per slot.
+            embedding_size (int): Size of the embeddings of the recognizer.
+        """
+        context = multiprocessing.get_context("spawn")
+        self.ring = EmbeddingRing(slots, max_batch, embedding_size)
+        self.requests = context.Queue()
+        self.done = [context.Semaphore(0) for _ in range(slots)]
+        self.free_slots = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+
+        ready = context.Queue()
+        ring_args = (slots, max_batch, embedding_size, self.ring.name)
+        self.processes = [
+            context.Process(
+                target=embedding_worker,
+                args=(loader, recognition_config, ring_args, self.requests, ready, self.done),
+                daemon=True,
+            )
+            for _ in range(processes)
+        ]
+        for process in self.processes:
+            process.start()
+
+        # A worker that dies while starting never answers
+        errors = []
+        while len(errors) < len(self.processes):
+            try:
+                errors.append(ready.get(timeout=1.0))
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    errors.append("worker process exited")
+                    break
+        errors = [error for error in errors if error is not None]
+        if errors:
+            self.close()
+            raise RuntimeError(f"Recognition worker failed to load the model: {errors[0]}")
+
+    def __call__(self, face_images):
+        """
+        Embed aligned crops.
+
+        Args:
+            face_images: The 112x112 BGR crops, a list or an N x 112 x 112 x 3 array.
+
+        Returns:
+            numpy.ndarray: The N x embedding_size embeddings, not normalized.
+        """
+        max_batch = self.ring.max_batch
+        embeddings = np.empty((len(face_images), self.ring.embedding_size), np.float32)
+
+        # Hand the chunks to the workers while there are free slots, then reuse the slots of the first ones.
+        # Only a caller holding no slot blocks on the free slots, so callers cannot deadlock each other.
+        chunks = collections.deque()
+        failed = False
+        for start in range(0, len(face_images), max_batch):
+            chunk = face_images[start : start + max_batch]
+            try:
+                slot = self.free_slots.get(block=not chunks)
+            except queue.Empty:
+                slot = chunks[0][0]
+                failed = not self.collect(chunks.popleft(), embeddings) or failed
+            for i, face_image in enumerate(chunk):
+                self.ring.crops[slot, i] = face_image
+            self.requests.put((slot, len(chunk)))
+            chunks.append((slot, start, len(chunk)))
+
+        while chunks:
+            slot = chunks[0][0]
+            failed = not self.collect(chunks.popleft(), embeddings) or failed
+            self.free_slots.put(slot)
+        if failed:
+            raise RuntimeError("Recognition worker failed to embed a batch")
+
+        return embeddings
+
+    def collect(self, chunk, embeddings):
+        """Wait for the embeddings of a chunk and copy them out of its slot, False if the worker failed."""
+        slot, start, count = chunk
+        while not self.done[slot].acquire(timeout=1.0):
+            if not all(process.is_alive() for process in self.processes):
+                raise RuntimeError("Recognition worker died")
+        embeddings[start : start + count] = self.ring.embeddings[slot, :count]
+        return self.ring.status[slot] == count
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        if self.ring is None:
+            return
+        for _ in self.processes:
+            self.requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close(unlink=True)
+        self.ring = None
@@ -0,0 +1,117 @@
+import dataclasses
+import threading
+
+import numpy as np
+
+from face_tracking.tracker.matching import bbox_ious
+
+
+@dataclasses.dataclass
+class ReembedPolicy:
+    """
+    Decide when a tracked face has to be embedded again.
+
+    A track is skipped when it is already confidently recognized, when it was
+    embedded recently, or when its box has barely moved since the last embedding.
+    """
+
+    confident_score: float = 0.5
+    min_embeds: int = 3
+    recheck_interval: int = 150
+    reembed_interval: int = 5
+    box_iou_thresh: float = 0.9
+    max_stale_frames: int = 30
+
+    @classmethod
+    def from_config(cls, config):
+        fields = {f.name for f in dataclasses.fields(cls)}
+        return cls(**{k: v for k, v in config.items() if k in fields})
+
+
+@dataclasses.dataclass
+class TrackRecognition:
+    caption: str
+    best_score: float
+    embed_count: int
+    last_frame: int
+    last_bbox: np.ndarray
+    last_checked_frame: int = -1
+
+
+class RecognitionCache:
+    """Per-track recognition results, shared by the tracking and recognition threads."""
+
+    def __init__(self, policy: ReembedPolicy = None):
+        self.policy = policy or ReembedPolicy()
+        self.entries: dict[int, TrackRecognition] = {}
+        self.embedded_calls = 0
+        self.saved_calls = 0
+        self._lock = threading.Lock()
+
+    def should_embed(self, track_id, frame_id, bbox):
+        """
+        Check whether a track needs a new ArcFace embedding.
+
+        Args:
+            track_id (int): The tracking ID.
+            frame_id (int): The frame the crop comes from.
+            bbox: The current tracking box (x_min, y_min, x_max, y_max).
+
+        Returns:
+            bool: True if the track has to be embedded, False if the cached result is kept.
+        """
+        with self._lock:
+            entry = self.entries.get(track_id)
+            if entry is None:
+                return True
+
+            policy = self.policy
+            age = frame_id - entry.last_frame
+            confident = entry.best_score >= policy.confident_score and entry.embed_count >= policy.min_embeds
+            if confident and age < policy.recheck_interval:
+                skip = True
+            elif age < policy.reembed_interval:
+                skip = True
+            else:
+                skip = age < policy.max_stale_frames and bbox_ious([bbox], [entry.last_bbox])[0, 0] >= policy.box_iou_thresh
+
+            # Count a saved call once per frame, the recognition loop may see the same frame several times
+            if skip and entry.last_checked_frame != frame_id:
+                self.saved_calls += 1
+            entry.last_checked_frame = frame_id
+            return not skip
+
+    def update(self, track_id, frame_id, bbox, score, caption):
+        """
+        Store a new embedding result for a track.
+
+        Returns:
+            str: The caption of the best result seen so far for this track.
+        """
+        with self._lock:
+            self.embedded_calls += 1
+            entry = self.entries.get(track_id)
+            if entry is None:
+                entry = TrackRecognition(caption, score, 0, frame_id, np.asarray(bbox))
+                self.entries[track_id] = entry
+            elif score >= entry.best_score:
+                entry.best_score = score
+                entry.caption = caption
+
+            entry.embed_count += 1
+            entry.last_frame = frame_id
+            entry.last_bbox = np.asarray(bbox)
+            return entry.caption
+
+    def evict(self, track_ids):
+        """Drop the entries of tracks the tracker has removed."""
+        with self._lock:
+            for track_id in track_ids:
+                self.entries.pop(track_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"embedded_calls": self.embedded_calls, "saved_calls": self.saved_calls}
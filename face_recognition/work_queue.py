@@ -0,0 +1,127 @@
+import collections
+import dataclasses
+import functools
+import threading
+
+import numpy as np
+
+from face_alignment.alignment import norm_crop
+
+
+@dataclasses.dataclass
+class RecognitionJob:
+    track_id: int
+    frame_id: int
+    bbox: tuple
+    image: np.ndarray
+    landmark: np.ndarray
+    # Recognizer that applies the result, the queue can be shared by several cameras
+    owner: object = None
+
+    @property
+    def key(self):
+        return self.owner, self.track_id
+
+    @functools.cached_property
+    def face_image(self):
+        """Aligned crop, computed by the worker so replaced and dropped jobs are never aligned."""
+        return norm_crop(img=self.image, landmark=self.landmark)
+
+
+class RecognitionQueue:
+    """
+    Bounded queue of face crops to embed, filled by the tracking thread and drained by workers.
+
+    A track has at most one pending job, a newer crop replaces the older one, and no job
+    is queued for a track whose embedding is being computed. When the queue is full the
+    oldest job is dropped. Jobs of tracks the tracker removed are discarded, also when
+    they are already taken by a worker.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.condition = threading.Condition()
+        self.pending: collections.OrderedDict = collections.OrderedDict()
+        self.in_flight = set()
+        self.cancelled = set()
+        self.dropped_jobs = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, jobs):
+        """Queue the jobs and wake up a worker."""
+        with self.condition:
+            for job in jobs:
+                if job.key in self.in_flight:
+                    continue
+                self.pending.pop(job.key, None)
+                self.pending[job.key] = job
+                if len(self.pending) > self.maxsize:
+                    self.pending.popitem(last=False)
+                    self.dropped_jobs += 1
+            if self.pending:
+                self.condition.notify()
+
+    def get_batch(self, max_batch, timeout=None):
+        """
+        Take up to `max_batch` jobs, oldest first.
+
+        Args:
+            max_batch (int): Maximum number of jobs.
+            timeout (float): Maximum wait for a job in seconds, None waits forever.
+
+        Returns:
+            list: The jobs, empty if none came before the timeout.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.pending, timeout):
+                return []
+            batch = []
+            while self.pending and len(batch) < max_batch:
+                key, job = self.pending.popitem(last=False)
+                self.in_flight.add(key)
+                batch.append(job)
+            # Let another worker take the rest
+            if self.pending:
+                self.condition.notify()
+            return batch
+
+    def done(self, jobs):
+        """
+        Release the jobs of a batch.
+
+        Returns:
+            list: Indices of the jobs whose track still exists.
+        """
+        with self.condition:
+            kept = []
+            for i, job in enumerate(jobs):
+                self.in_flight.discard(job.key)
+                if job.key in self.cancelled:
+                    self.cancelled.discard(job.key)
+                else:
+                    kept.append(i)
+            return kept
+
+    def discard(self, owner, track_ids):
+        """Drop the jobs of tracks the tracker removed."""
+        with self.condition:
+            for track_id in track_ids:
+                key = (owner, track_id)
+                if self.pending.pop(key, None) is not None:
+                    self.dropped_jobs += 1
+                if key in self.in_flight:
+                    self.cancelled.add(key)
+
+    def clear(self, owner=None):
+        """Drop the pending jobs of one owner, of every owner if None."""
+        with self.condition:
+            for key in [key for key in self.pending if owner is None or key[0] is owner]:
+                del self.pending[key]
+            self.cancelled.update(key for key in self.in_flight if owner is None or key[0] is owner)
+
+    def wake_all(self):
+        """Wake up the waiting workers, e.g. to let them see a stop."""
+        with self.condition:
+            self.condition.notify_all()
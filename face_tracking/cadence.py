@@ -0,0 +1,141 @@
+import dataclasses
+
+import numpy as np
+
+
+@dataclasses.dataclass
+class DetectionCadence:
+    """
+    Decide on which frames the face detector runs, tracks are only predicted on the others.
+
+    After every detection the next one is planned from the tracks: the interval shrinks
+    when tracks move fast compared with their size or when there are many of them, and
+    the next frame is detected again when a track is new or was matched with a low score.
+    `max_interval: 1` runs the detector on every frame.
+
+    Between full-frame scans, at least every `full_scan_interval` frames, the detector can
+    run only on padded regions around the tracks, at `roi_input_size` instead of the
+    full-frame input size. More than `max_rois` regions cost more than a full-frame scan,
+    the full frame is scanned instead. `full_scan_interval: 0` always scans the full frame.
+    When the user drew detection zones, the regions are clipped to them and the zones take
+    the place of the full frame.
+    """
+
+    max_interval: int = 1
+    idle_interval: int = 3
+    max_drift: float = 0.15
+    crowd_tracks: int = 4
+    min_score: float = 0.6
+    full_scan_interval: int = 0
+    roi_padding: float = 0.5
+    roi_input_size: int = 64
+    max_rois: int = 4
+    next_detection: int = dataclasses.field(default=0, init=False)
+    last_full_scan: int = dataclasses.field(default=-(2**31), init=False)
+
+    @classmethod
+    def from_config(cls, config):
+        fields = {f.name for f in dataclasses.fields(cls) if f.init}
+        return cls(**{k: v for k, v in (config or {}).items() if k in fields})
+
+    def should_detect(self, frame_id):
+        return frame_id >= self.next_detection
+
+    def detection_zones(self, frame_id, tracks, image_shape, zones=None):
+        """
+        Pick the zones to detect on a detection frame.
+
+        Args:
+            frame_id (int): The frame about to be detected.
+            tracks (list): The tracks to look for, at their predicted position.
+            image_shape (tuple): Shape of the frame.
+            zones (list): The (x, y, w, h) detection zones drawn by the user, None or empty for the full frame.
+
+        Returns:
+            list: Padded (x, y, w, h) regions around the tracks within the zones, None for a full scan of the zones.
+        """
+        rois = []
+        if self.full_scan_interval > 0 and frame_id - self.last_full_scan < self.full_scan_interval:
+            rois = track_rois(tracks, image_shape, self.roi_padding)
+            if zones:
+                rois = clip_rois(rois, zones)
+        if not rois or len(rois) > self.max_rois:
+            self.last_full_scan = frame_id
+            return None
+        return rois
+
+    def schedule(self, frame_id, tracks):
+        """
+        Plan the next detection after a detection on `frame_id`.
+
+        Args:
+            frame_id (int): The frame the detector just ran on.
+            tracks (list): The tracked STracks, confirmed or not, after the tracker update.
+        """
+        self.next_detection = frame_id + self.interval(tracks)
+
+    def interval(self, tracks):
+        if self.max_interval <= 1:
+            return 1
+        if not tracks:
+            return min(self.idle_interval, self.max_interval)
+
+        # New tracks are removed if the next detection does not confirm them
+        if any(not track.is_activated or track.score < self.min_score for track in tracks):
+            return 1
+
+        # Kalman center velocity in pixels per frame, relative to the box height
+        means = np.array([track.mean for track in tracks])
+        speed = np.hypot(means[:, 4], means[:, 5]) / np.maximum(means[:, 3], 1)
+        fastest = speed.max()
+        interval = self.max_interval if fastest <= 0 else int(self.max_drift / fastest)
+
+        # Identity switches get likelier between detections when the frame is crowded
+        interval = interval * self.crowd_tracks // max(len(tracks), self.crowd_tracks)
+        return int(np.clip(interval, 1, self.max_interval))
+
+
+def track_rois(tracks, image_shape, padding):
+    """
+    Square regions around the tracks, `padding` times the box size on every side, clipped to the frame.
+
+    Args:
+        tracks (list): The tracks, at their predicted position.
+        image_shape (tuple): Shape of the frame.
+        padding (float): Margin around every box, relative to its largest side.
+
+    Returns:
+        list: Integer (x, y, w, h) regions, overlapping detections are merged by the detector NMS.
+    """
+    height, width = image_shape[:2]
+    rois = []
+    for track in tracks:
+        x, y, w, h = track.tlwh
+        half_side = max(w, h) * (0.5 + padding)
+        cx, cy = x + w / 2, y + h / 2
+        x1, y1 = int(max(cx - half_side, 0)), int(max(cy - half_side, 0))
+        x2, y2 = int(min(cx + half_side, width)), int(min(cy + half_side, height))
+        if x2 - x1 > 1 and y2 - y1 > 1:
+            rois.append([x1, y1, x2 - x1, y2 - y1])
+    return rois
+
+
+def clip_rois(rois, zones):
+    """
+    Intersect regions with detection zones.
+
+    Args:
+        rois (list): Integer (x, y, w, h) regions.
+        zones (list): (x, y, w, h) detection zones.
+
+    Returns:
+        list: The non-empty intersections of every region with every zone.
+    """
+    clipped = []
+    for x, y, w, h in rois:
+        for zx, zy, zw, zh in zones:
+            x1, y1 = max(x, int(zx)), max(y, int(zy))
+            x2, y2 = min(x + w, int(zx + zw)), min(y + h, int(zy + zh))
+            if x2 - x1 > 1 and y2 - y1 > 1:
+                clipped.append([x1, y1, x2 - x1, y2 - y1])
+    return clipped
@@ -0,0 +1,39 @@
+import dataclasses
+
+import numpy as np
+
+
+@dataclasses.dataclass(frozen=True)
+class TrackingSnapshot:
+    """
+    Detections and tracks of one processed frame, never modified once created.
+
+    The boxes, landmarks and image always come from the same frame.
+    """
+
+    frame_id: int
+    raw_image: np.ndarray
+    detection_bboxes: np.ndarray
+    detection_landmarks: np.ndarray
+    tracking_ids: tuple
+    tracking_bboxes: tuple
+
+    @classmethod
+    def create(cls, frame_id, raw_image, detection_bboxes, detection_landmarks, tracking_ids, tracking_bboxes):
+        return cls(
+            frame_id=frame_id,
+            raw_image=read_only(raw_image),
+            detection_bboxes=read_only(detection_bboxes),
+            detection_landmarks=read_only(detection_landmarks),
+            tracking_ids=tuple(tracking_ids),
+            tracking_bboxes=tuple(tuple(bbox) for bbox in tracking_bboxes),
+        )
+
+
+def read_only(array):
+    """Read-only view of an array, the owner of the data can still write to it."""
+    if array is None or len(array) == 0:
+        return np.empty((0,))
+    view = np.asarray(array).view()
+    view.flags.writeable = False
+    return view
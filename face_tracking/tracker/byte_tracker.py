@@ -1,8 +1,6 @@
 import os
 import sys
 
-import torch
-
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(BASE_DIR)
 
@@ -157,6 +155,7 @@ class BYTETracker(object):
         self.tracked_stracks = []  # type: list[STrack]
         self.lost_stracks = []  # type: list[STrack]
         self.removed_stracks = []  # type: list[STrack]
+        self.newly_removed_stracks = []  # type: list[STrack]
 
         self.frame_id = 0
         self.args = args
@@ -166,6 +165,22 @@ class BYTETracker(object):
         self.max_time_lost = self.buffer_size
         self.kalman_filter = KalmanFilter()
 
+    def predict(self):
+        """
+        Advance the tracks by one frame without detections, with the Kalman filter only.
+
+        Returns:
+            list: The activated tracks at their predicted position.
+        """
+        self.frame_id += 1
+        self.newly_removed_stracks = []
+
+        # Same tracks as the prediction step of `update`, unconfirmed ones wait for a detection
+        STrack.multi_predict(
+            joint_stracks([t for t in self.tracked_stracks if t.is_activated], self.lost_stracks)
+        )
+        return [track for track in self.tracked_stracks if track.is_activated]
+
     def update(self, output_results, img_info, img_size):
         self.frame_id += 1
         activated_starcks = []
@@ -189,10 +204,10 @@ class BYTETracker(object):
         inds_high = scores < self.args["track_thresh"]
 
         inds_second = np.logical_and(inds_low, inds_high)
-        dets_second = bboxes[inds_second.to(torch.bool)]
+        dets_second = bboxes[inds_second]
         dets = bboxes[remain_inds]
         scores_keep = scores[remain_inds]
-        scores_second = scores[inds_second.to(torch.bool)]
+        scores_second = scores[inds_second]
 
         if len(dets) > 0:
             """Detections"""
@@ -308,6 +323,7 @@ class BYTETracker(object):
         self.lost_stracks.extend(lost_stracks)
         self.lost_stracks = sub_stracks(self.lost_stracks, self.removed_stracks)
         self.removed_stracks.extend(removed_stracks)
+        self.newly_removed_stracks = removed_stracks
         self.tracked_stracks, self.lost_stracks = remove_duplicate_stracks(
             self.tracked_stracks, self.lost_stracks
         )
@@ -1,7 +1,6 @@
 import os
 import sys
 
-import kalman_filter
 import numpy as np
 from scipy.optimize import linear_sum_assignment
 from scipy.spatial.distance import cdist
@@ -9,6 +8,8 @@ from scipy.spatial.distance import cdist
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(BASE_DIR)
 
+import kalman_filter
+
 # Other function definitions remain the same
 
 
@@ -58,6 +59,40 @@ def bbox_iou(box1, box2):
     return iou
 
 
+def _as_tlbrs(tlbrs):
+    tlbrs = np.asarray(tlbrs, dtype=np.float64)
+    if tlbrs.size == 0:
+        return tlbrs.reshape(0, 4)
+    # Extra columns (e.g. detection scores) are ignored
+    return tlbrs.reshape(len(tlbrs), -1)[:, :4]
+
+
+def bbox_ious(atlbrs, btlbrs, pixel_offset=0):
+    """
+    Compute the IoU matrix of two sets of bounding boxes in one broadcasted pass.
+    :param atlbrs: N x 4 tlbr boxes
+    :param btlbrs: M x 4 tlbr boxes
+    :param pixel_offset: 0 for continuous coordinates (same as bbox_iou),
+        1 for the inclusive pixel convention (w = x2 - x1 + 1)
+
+    :rtype ious np.ndarray, N x M
+    """
+    a = _as_tlbrs(atlbrs)
+    b = _as_tlbrs(btlbrs)
+
+    # Intersection of every pair
+    inter_w = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]) + pixel_offset
+    inter_h = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]) + pixel_offset
+    inter_area = np.maximum(inter_w, 0) * np.maximum(inter_h, 0)
+
+    # Union of every pair
+    a_area = (a[:, 2] - a[:, 0] + pixel_offset) * (a[:, 3] - a[:, 1] + pixel_offset)
+    b_area = (b[:, 2] - b[:, 0] + pixel_offset) * (b[:, 3] - b[:, 1] + pixel_offset)
+    union_area = a_area[:, None] + b_area[None, :] - inter_area
+
+    return inter_area / union_area
+
+
 def ious(atlbrs, btlbrs):
     """
     Compute cost based on IoU
@@ -66,11 +101,7 @@ def ious(atlbrs, btlbrs):
 
     :rtype ious np.ndarray
     """
-    ious = np.zeros((len(atlbrs), len(btlbrs)), dtype=np.float64)
-    for i, box1 in enumerate(atlbrs):
-        for j, box2 in enumerate(btlbrs):
-            ious[i, j] = bbox_iou(box1, box2)
-    return ious
+    return bbox_ious(atlbrs, btlbrs)
 
 
 def iou_distance(atracks, btracks):
@@ -0,0 +1,182 @@
+import threading
+import time
+
+import yaml
+
+from desktop.video_source.base import VideoSource
+from face_recognition.work_queue import RecognitionQueue
+from recognizer import ModelPool, Recognizer
+
+
+class MultiCameraRecognizer:
+    """
+    Run several cameras in one process with one shared detector and recognizer.
+
+    Every camera keeps its own Recognizer state (tracker, recognition cache, frames),
+    but none of them starts threads. One detection thread batches the frames of the
+    cameras picked by the scheduler into a single SCRFD call, and the recognition workers
+    drain one job queue shared by all cameras, batching their face crops into single
+    ArcFace forward passes.
+    """
+
+    def __init__(self, video_sources: list[VideoSource],
+                 tracking_config_file: str = "face_tracking/config/config_tracking.yaml",
+                 recognition_config_file: str = "face_recognition/config/config_recognition.yaml",
+                 max_cameras_per_batch: int = None):
+
+        self.is_running = None
+        self.detection_thread = None
+        self.recognition_threads = []
+        self.cameras = []
+
+        with open(recognition_config_file, "r") as stream:
+            recognition_config = yaml.safe_load(stream)
+
+        # Weights are loaded once, whatever the number of cameras
+        self.models = ModelPool(recognition_config)
+        self.cameras = [
+            Recognizer(
+                video_source=video_source,
+                tracking_config_file=tracking_config_file,
+                recognition_config_file=recognition_config_file,
+                models=self.models,
+            )
+            for video_source in video_sources
+        ]
+        self.max_cameras_per_batch = max_cameras_per_batch or len(self.cameras)
+
+        # One queue for the crops of every camera, the jobs know the camera they come from
+        self.jobs = RecognitionQueue(recognition_config.get("recognition_queue_size", 64))
+        self.recognition_workers = recognition_config.get("recognition_workers", 1)
+        self.recognition_batch_size = recognition_config.get("recognition_batch_size", 16)
+        for camera in self.cameras:
+            camera.jobs = self.jobs
+
+        self.frame_ids = [0] * len(self.cameras)
+        self.last_served = [0.0] * len(self.cameras)
+        self.fps = [-1.0] * len(self.cameras)
+
+    def get_camera(self, index):
+        return self.cameras[index]
+
+    def schedule(self):
+        """
+        Pick the cameras to process in the next detection batch.
+
+        Cameras with a new frame are served least recently served first, so a busy
+        camera cannot starve the others when the batch is smaller than the number of cameras.
+        """
+        ready = []
+        for i, camera in enumerate(self.cameras):
+            source = camera.get_video_source()
+            if source is None:
+                continue
+            # Sources without a background grabber always have a frame to read
+            if hasattr(source, "has_new_frame") and not source.has_new_frame():
+                continue
+            ready.append(i)
+
+        ready.sort(key=lambda i: self.last_served[i])
+        return ready[: self.max_cameras_per_batch]
+
+    def detection(self):
+        """Face detection and tracking for all cameras in a separate thread."""
+        while self.is_running:
+            indices = self.schedule()
+            if not indices:
+                time.sleep(0.005)
+                continue
+
+            # Cameras whose detection cadence skips this frame only predict their tracks, the others
+            # scan their full frame or only the regions around their tracks, in one batch per input size
+            scans = {}
+            served = []
+            for i in indices:
+                camera = self.cameras[i]
+                frame = camera.get_video_source().get_frame()
+                if frame is None:
+                    # No new frame, this camera keeps its tracks and frame ID
+                    continue
+                served.append(i)
+                if not camera.cadence.should_detect(self.frame_ids[i]):
+                    camera.publish_image(camera.process_prediction(frame, self.frame_ids[i], self.fps[i]))
+                    continue
+
+                tracker = camera.tracker
+                rois = camera.cadence.detection_zones(
+                    self.frame_ids[i],
+                    tracker.tracked_stracks + tracker.lost_stracks,
+                    frame.shape,
+                    camera.detection_zones,
+                )
+                if rois is None:
+                    # Full-frame input size of detect_tracking
+                    scans.setdefault((128, 128), []).append((i, frame, camera.detection_zones))
+                else:
+                    input_size = (camera.cadence.roi_input_size, camera.cadence.roi_input_size)
+                    scans.setdefault(input_size, []).append((i, frame, rois))
+
+            for input_size, scan in scans.items():
+                results = self.models.detector.detect_tracking_batch(
+                    [frame for _, frame, _ in scan], [zones for _, _, zones in scan], input_size=input_size
+                )
+                for (i, _, _), (outputs, img_info, bboxes, landmarks) in zip(scan, results):
+                    camera = self.cameras[i]
+                    camera.publish_image(
+                        camera.process_detections(outputs, img_info, bboxes, landmarks, self.frame_ids[i], self.fps[i])
+                    )
+
+            now = time.time()
+            for i in served:
+                self.frame_ids[i] += 1
+                if self.last_served[i] > 0:
+                    elapsed = now - self.last_served[i]
+                    self.fps[i] = 1 / elapsed if self.fps[i] <= 0 else 0.9 * self.fps[i] + 0.1 / elapsed
+                self.last_served[i] = now
+
+    def recognize(self):
+        """Face recognition worker for all cameras, one of `recognition_workers` threads."""
+        while self.is_running:
+            jobs = self.jobs.get_batch(self.recognition_batch_size, timeout=0.1)
+            if not jobs:
+                continue
+
+            # One forward pass for the faces of every camera
+            scores, names = self.models.recognition_batch(face_images=[job.face_image for job in jobs])
+
+            camera_jobs = {}
+            for i in self.jobs.done(jobs):
+                camera_jobs.setdefault(jobs[i].owner, []).append(i)
+            for camera, indices in camera_jobs.items():
+                camera.apply_recognitions([jobs[i] for i in indices], scores[indices], names[indices])
+
+    def get_fps(self):
+        """Processed frames per second of every camera."""
+        return list(self.fps)
+
+    def start(self):
+        self.is_running = True
+        self.detection_thread = threading.Thread(target=self.detection)
+        self.detection_thread.start()
+        self.recognition_threads = [
+            threading.Thread(target=self.recognize) for _ in range(self.recognition_workers)
+        ]
+        for thread in self.recognition_threads:
+            thread.start()
+
+    def stop(self):
+        if self.is_running:
+            self.is_running = False
+            if self.detection_thread is not None:
+                self.detection_thread.join()
+            self.jobs.wake_all()
+            for thread in self.recognition_threads:
+                thread.join()
+            for i, camera in enumerate(self.cameras):
+                camera.print_recognition_stats(f"Camera {i}")
+        for camera in self.cameras:
+            camera.stop()
+        self.models.close()
+
+    def __del__(self):
+        self.stop()
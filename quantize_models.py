@@ -0,0 +1,198 @@
+"""
+Quantize the ArcFace and SCRFD ONNX models to INT8 with static calibration, then check them against FP32.
+
+Run from the repository root, after exporting ArcFace with `python -m face_recognition.arcface.export_onnx`:
+
+    python quantize_models.py --arcface face_recognition/arcface/weights/arcface_r100.onnx \
+        --scrfd face_detection/scrfd/weights/scrfd_10g_bnkps.onnx
+
+The quantized models are written next to the originals with an `_int8` suffix. The command exits
+with status 1 when a model drifts more than the accuracy gate allows.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from face_detection.scrfd.detector import SCRFD
+from face_recognition.arcface.onnx_model import ArcFaceONNX
+from face_recognition.arcface.utils import FacePreprocessor, load_images, read_features
+from face_tracking.tracker.matching import bbox_ious
+
+
+class ArrayCalibrationReader(CalibrationDataReader):
+    """Feed a list of input batches to the onnxruntime calibration."""
+
+    def __init__(self, input_name, batches):
+        self.input_name = input_name
+        self.batches = iter(batches)
+
+    def get_next(self):
+        batch = next(self.batches, None)
+        return None if batch is None else {self.input_name: batch}
+
+
+def quantized_path(model_path):
+    return os.path.splitext(model_path)[0] + "_int8.onnx"
+
+
+def quantize(model_path, input_name, batches, output_path):
+    """Static INT8 quantization: per-channel int8 weights, uint8 activations calibrated on `batches`."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Shape inference and graph fusions first, quantizing the unfused graph leaves it slower than FP32
+        preprocessed_path = os.path.join(tmp_dir, "preprocessed.onnx")
+        quant_pre_process(model_path, preprocessed_path)
+        quantize_static(
+            preprocessed_path,
+            output_path,
+            ArrayCalibrationReader(input_name, batches),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+
+
+def arcface_batches(faces, batch_size=16):
+    # The preprocessor reuses its buffer, every calibration batch needs its own copy
+    preprocess = FacePreprocessor()
+    return [preprocess(faces[i : i + batch_size]).copy() for i in range(0, len(faces), batch_size)]
+
+
+def scrfd_blob(detector, image, input_size):
+    """Letterbox the full image into `input_size` like the detector does and build the network input."""
+    height, width = image.shape[:2]
+    det_img, _ = detector.get_resized_subimage(image, (0, 0, width, height), input_size)
+    return cv2.dnn.blobFromImage(det_img, 1.0 / 128, input_size, (127.5, 127.5, 127.5), swapRB=True)
+
+
+def verify_arcface(fp32_path, int8_path, faces, names, feature_path, batch_size=64):
+    """
+    Compare INT8 embeddings with FP32 ones and their top-1 identity on the enrolled gallery.
+
+    Returns:
+        dict: Mean and min cosine between FP32 and INT8 embeddings, top-1 agreement and accuracies.
+    """
+    fp32, int8 = ArcFaceONNX(fp32_path), ArcFaceONNX(int8_path)
+    preprocess = FacePreprocessor()
+
+    embs_fp32, embs_int8 = [], []
+    for i in range(0, len(faces), batch_size):
+        batch = preprocess(faces[i : i + batch_size])
+        embs_fp32.append(fp32(batch))
+        embs_int8.append(int8(batch))
+    embs_fp32 = np.concatenate(embs_fp32)
+    embs_int8 = np.concatenate(embs_int8)
+    embs_fp32 /= np.linalg.norm(embs_fp32, axis=1, keepdims=True)
+    embs_int8 /= np.linalg.norm(embs_int8, axis=1, keepdims=True)
+
+    cosines = (embs_fp32 * embs_int8).sum(axis=1)
+    report = {"mean_cosine": float(cosines.mean()), "min_cosine": float(cosines.min())}
+
+    # The gallery stays FP32, it is not re-enrolled when the model is swapped
+    gallery = read_features(feature_path)
+    if gallery is not None:
+        gallery_names, gallery_embs = gallery
+        top1_fp32 = gallery_names[np.argmax(embs_fp32 @ gallery_embs.T, axis=1)]
+        top1_int8 = gallery_names[np.argmax(embs_int8 @ gallery_embs.T, axis=1)]
+        report["top1_agreement"] = float((top1_fp32 == top1_int8).mean())
+        report["top1_accuracy_fp32"] = float((top1_fp32 == names).mean())
+        report["top1_accuracy_int8"] = float((top1_int8 == names).mean())
+    return report
+
+
+def verify_scrfd(fp32_path, int8_path, images, input_size, thresh=0.5, iou_thresh=0.5):
+    """
+    Compare INT8 detections with FP32 ones.
+
+    Returns:
+        dict: Share of FP32 faces found again by INT8 and the number of faces found by each model.
+    """
+    fp32, int8 = SCRFD(model_file=fp32_path), SCRFD(model_file=int8_path)
+
+    matched = faces_fp32 = faces_int8 = 0
+    for image in images:
+        bboxes_fp32, _ = fp32.detect(image, thresh=thresh, input_size=input_size)
+        bboxes_int8, _ = int8.detect(image, thresh=thresh, input_size=input_size)
+        faces_fp32 += len(bboxes_fp32)
+        faces_int8 += len(bboxes_int8)
+        if len(bboxes_fp32) and len(bboxes_int8):
+            ious = bbox_ious(bboxes_fp32[:, :4], bboxes_int8[:, :4])
+            matched += int((ious.max(axis=1) > iou_thresh).sum())
+
+    recall = matched / faces_fp32 if faces_fp32 else 1.0
+    return {"detection_recall": recall, "faces_fp32": faces_fp32, "faces_int8": faces_int8}
+
+
+def print_report(model_path, report):
+    print(model_path)
+    for key, value in report.items():
+        print(f"  {key:<20} {value:.4f}" if isinstance(value, float) else f"  {key:<20} {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arcface", type=str, default=None, help="FP32 ArcFace ONNX model to quantize.")
+    parser.add_argument("--scrfd", type=str, default=None, help="FP32 SCRFD ONNX model to quantize.")
+    parser.add_argument(
+        "--faces-dir", type=str, default="./datasets/data", help="Enrolled faces, ArcFace calibration data."
+    )
+    parser.add_argument(
+        "--images-dir", type=str, default="./datasets/backup", help="Full images, SCRFD calibration data."
+    )
+    parser.add_argument(
+        "--features-path",
+        type=str,
+        default="./datasets/face_features/feature",
+        help="Enrolled gallery used to compare top-1 identities.",
+    )
+    parser.add_argument("--calibration-size", type=int, default=256, help="Images used for calibration.")
+    parser.add_argument(
+        "--detector-input-size", type=int, nargs=2, default=[128, 128], help="SCRFD input width and height."
+    )
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Lowest mean FP32/INT8 embedding cosine.")
+    parser.add_argument(
+        "--min-agreement", type=float, default=0.99, help="Lowest share of unchanged top-1 identities."
+    )
+    parser.add_argument(
+        "--min-detection-recall", type=float, default=0.95, help="Lowest share of FP32 faces found by INT8."
+    )
+    opt = parser.parse_args()
+
+    passed = True
+    if opt.arcface is not None:
+        faces, names = load_images(opt.faces_dir)
+        calibration, _ = load_images(opt.faces_dir, limit=opt.calibration_size)
+        output_path = quantized_path(opt.arcface)
+        quantize(opt.arcface, ArcFaceONNX(opt.arcface).input_name, arcface_batches(calibration), output_path)
+
+        report = verify_arcface(opt.arcface, output_path, faces, names, opt.features_path)
+        print_report(output_path, report)
+        passed &= report["mean_cosine"] >= opt.min_cosine
+        if "top1_agreement" in report:
+            passed &= report["top1_agreement"] >= opt.min_agreement
+        else:
+            print(f"No enrolled gallery at {opt.features_path}, the top-1 identities cannot be checked.")
+            passed = False
+
+    if opt.scrfd is not None:
+        input_size = tuple(opt.detector_input_size)
+        images, _ = load_images(opt.images_dir)
+        calibration, _ = load_images(opt.images_dir, limit=opt.calibration_size)
+        output_path = quantized_path(opt.scrfd)
+        detector = SCRFD(model_file=opt.scrfd)
+        batches = [scrfd_blob(detector, image, input_size) for image in calibration]
+        quantize(opt.scrfd, detector.input_name, batches, output_path)
+
+        report = verify_scrfd(opt.scrfd, output_path, images, input_size)
+        print_report(output_path, report)
+        passed &= report["detection_recall"] >= opt.min_detection_recall
+
+    if not passed:
+        print("Accuracy gate failed, keep the FP32 models.")
+        sys.exit(1)
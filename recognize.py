@@ -5,13 +5,12 @@ import cv2
 import numpy as np
 import torch
 import yaml
-from torchvision import transforms
 
 from face_alignment.alignment import norm_crop
 from face_detection.scrfd.detector import SCRFD
 from face_detection.yolov5_face.detector import Yolov5Face
 from face_recognition.arcface.model import iresnet_inference
-from face_recognition.arcface.utils import compare_encodings, read_features
+from face_recognition.arcface.utils import FacePreprocessor, compare_encodings, read_features
 from face_tracking.tracker.byte_tracker import BYTETracker
 from face_tracking.tracker.visualize import plot_tracking
 
@@ -27,6 +26,7 @@ detector = SCRFD(model_file="face_detection/scrfd/weights/scrfd_2.5g_bnkps.onnx"
 recognizer = iresnet_inference(
     model_name="r100", path="face_recognition/arcface/weights/arcface_r100.pth", device=device
 )
+face_preprocess = FacePreprocessor()
 
 # Load precomputed face features and names
 images_names, images_embs = read_features(feature_path="datasets/face_features/feature")
@@ -132,19 +132,8 @@ def get_feature(face_image):
     Returns:
         numpy.ndarray: The extracted features.
     """
-    face_preprocess = transforms.Compose(
-        [
-            transforms.ToTensor(),
-            transforms.Resize((112, 112)),
-            transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5]),
-        ]
-    )
-
-    # Convert to RGB
-    face_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
-
     # Preprocess image (BGR)
-    face_image = face_preprocess(face_image).unsqueeze(0).to(device)
+    face_image = torch.from_numpy(face_preprocess(face_image)).to(device)
 
     # Inference to get feature
     emb_img_face = recognizer(face_image).cpu().numpy()
@@ -4,19 +4,21 @@ import stat
 import threading
 import time
 
-import cv2
 import numpy as np
-import torch
 import yaml
-from torchvision import transforms
 
+from desktop.frame_ring import FrameRing
 from desktop.video_source.base import VideoSource
-from face_alignment.alignment import norm_crop
 from face_detection.scrfd.detector import SCRFD
-from face_detection.yolov5_face.detector import Yolov5Face
-from face_recognition.arcface.model import iresnet_inference
-from face_recognition.arcface.utils import compare_encodings, read_features
+from face_recognition.arcface.feature_store import check_features_backbone
+from face_recognition.arcface.gallery import load_gallery_index
+from face_recognition.arcface.utils import FacePreprocessor
+from face_recognition.track_cache import RecognitionCache, ReembedPolicy
+from face_recognition.work_queue import RecognitionJob, RecognitionQueue
+from face_tracking.cadence import DetectionCadence
+from face_tracking.snapshot import TrackingSnapshot
 from face_tracking.tracker.byte_tracker import BYTETracker
+from face_tracking.tracker.matching import bbox_ious
 from face_tracking.tracker.visualize import plot_tracking
 
 
@@ -39,60 +41,187 @@ class Person:
         return self.name == other.name
 
 
+def load_recognizer(recognition_config):
+    """
+    Build the ArcFace recognizer of the configured backend.
+
+    Both backends take and return numpy batches, torch is only imported for the torch one.
+
+    Args:
+        recognition_config (dict): The recognition config.
+
+    Returns:
+        tuple: The device and the recognizer.
+    """
+    if recognition_config.get("recognizer_backend", "torch") == "onnx":
+        from face_recognition.arcface.onnx_model import ArcFaceONNX
+
+        recognizer = ArcFaceONNX(
+            recognition_config["recognizer_onnx"], **(recognition_config.get("onnx_options") or {})
+        )
+        return "cpu", recognizer
+
+    import torch
+
+    from face_recognition.arcface.model import IResNetEmbedder, iresnet_inference
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    device = torch.device('cpu')
+
+    model = iresnet_inference(
+        model_name=recognition_config["recognizer_backbone"],
+        path=recognition_config["recognizer_weights"],
+        device=device,
+        optimize=recognition_config.get("recognizer_optimize", True),
+    )
+    return device, IResNetEmbedder(model, device)
+
+
+class ModelPool:
+    """Face detector, face recognizer and gallery, loaded once and shared by every camera."""
+
+    def __init__(self, recognition_config):
+        self.detector = SCRFD(model_file=recognition_config["detector_model"])
+        # from face_detection.yolov5_face.detector import Yolov5Face
+        # self.detector = Yolov5Face(model_file="face_detection/yolov5_face/weights/yolov5n-0.5.pt")
+
+        # With recognizer_processes the recognizer only lives in worker processes fed with aligned crops
+        self.embedder = None
+        if recognition_config.get("recognizer_processes", 0) > 0:
+            from face_recognition.process_embedder import ProcessEmbedder
+
+            self.device = "cpu"
+            self.recognizer = None
+            self.embedder = ProcessEmbedder(
+                load_recognizer,
+                recognition_config,
+                processes=recognition_config["recognizer_processes"],
+                slots=recognition_config.get("recognizer_process_slots", 4),
+                max_batch=recognition_config.get("recognition_batch_size", 16),
+            )
+        else:
+            self.device, self.recognizer = load_recognizer(recognition_config)
+
+        # The batch of a FacePreprocessor is a reused buffer, every recognition worker thread gets its own
+        self.thread_local = threading.local()
+
+        # Embeddings of another backbone are not comparable with the gallery
+        check_features_backbone(recognition_config["feature_path"], recognition_config["recognizer_backbone"])
+        self.gallery = load_gallery_index(
+            feature_path=recognition_config["feature_path"],
+            backend=recognition_config["gallery_backend"],
+            max_exemplars=recognition_config["gallery_max_exemplars"],
+            **(recognition_config.get("gallery_options") or {}),
+        )
+
+    def get_preprocess(self):
+        """FacePreprocessor of the calling thread."""
+        preprocess = getattr(self.thread_local, "preprocess", None)
+        if preprocess is None:
+            preprocess = self.thread_local.preprocess = FacePreprocessor()
+        return preprocess
+
+    def get_features(self, face_images):
+        """
+        Extract features from a batch of face images with a single forward pass.
+
+        Safe to call from several threads.
+
+        Args:
+            face_images (list): The input face images (aligned 112x112 BGR crops).
+
+        Returns:
+            numpy.ndarray: The extracted features, one L2-normalized row per face.
+        """
+        if self.embedder is not None:
+            # The worker processes preprocess the crops themselves
+            emb_img_faces = self.embedder(face_images)
+        else:
+            # Preprocess every face into one N x 3 x 112 x 112 batch
+            batch = self.get_preprocess()(face_images)
+
+            # Inference to get features
+            emb_img_faces = self.recognizer(batch)
+
+        # Normalize every row
+        images_embs = emb_img_faces / np.linalg.norm(emb_img_faces, axis=1, keepdims=True)
+
+        return images_embs
+
+    def recognition_batch(self, face_images):
+        """
+        Recognize a batch of face images.
+
+        Args:
+            face_images (list): The input face images.
+
+        Returns:
+            tuple: Arrays with the recognition score and name of every face.
+        """
+        # Get features from all faces at once
+        query_embs = self.get_features(face_images)
+
+        scores, names, _ = self.gallery.search(query_embs, k=1)
+
+        return scores[:, 0], names[:, 0]
+
+    def close(self):
+        """Stop the recognition worker processes, if any."""
+        if self.embedder is not None:
+            self.embedder.close()
+
+
 class Recognizer:
     def __init__(self, video_source: VideoSource = None,
                  tracking_config_file: str = "face_tracking/config/config_tracking.yaml",
-                 hud_visible=True):
+                 recognition_config_file: str = "face_recognition/config/config_recognition.yaml",
+                 hud_visible=True,
+                 models: ModelPool = None):
 
         self.is_running = None
         self.tracking_thread = None
+        self.recognition_threads = []
 
         self.cap = video_source
         self.tracking_config = self.load_config(tracking_config_file)
+        self.recognition_config = self.load_config(recognition_config_file)
         self.hud_visible = hud_visible
 
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-        self.device = torch.device('cpu')
-
-        self.detector = SCRFD(model_file="face_detection/scrfd/weights/scrfd_10g_bnkps.onnx")
-        # self.detector = Yolov5Face(model_file="face_detection/yolov5_face/weights/yolov5n-0.5.pt")
-
-        self.recognizer = iresnet_inference(
-            model_name="r100", path="face_recognition/arcface/weights/arcface_r100.pth", device=self.device
-        )
+        # Models are shared when several cameras run in one process
+        self.owns_models = models is None
+        self.models = models if models is not None else ModelPool(self.recognition_config)
+        self.device = self.models.device
+        self.detector = self.models.detector
+        self.recognizer = self.models.recognizer
+        self.gallery = self.models.gallery
 
         self.tracker = BYTETracker(args=self.tracking_config, frame_rate=30)
-
-        self.images_names, self.images_embs = read_features(feature_path="datasets/face_features/feature")
+        self.cadence = DetectionCadence.from_config(self.tracking_config.get("detection_cadence"))
         self.id_face_mapping = {}
-        self.data_mapping = {
-            "raw_image": [],
-            "tracking_ids": [],
-            "detection_bboxes": [],
-            "detection_landmarks": [],
-            "tracking_bboxes": [],
-        }
+        self.recognition_cache = RecognitionCache(ReembedPolicy.from_config(self.recognition_config))
+        self.jobs = RecognitionQueue(self.recognition_config.get("recognition_queue_size", 64))
+        self.recognition_workers = self.recognition_config.get("recognition_workers", 1)
+        self.recognition_batch_size = self.recognition_config.get("recognition_batch_size", 16)
 
         self.tracking_image = None
+        self.frames = FrameRing()
+        self.blank_image = None
         self.detection_zones = None
         self.recognized_persons: list[Person] = []
 
     def reset_mappings(self):
         self.id_face_mapping = {}
-        self.data_mapping = {
-            "raw_image": [],
-            "tracking_ids": [],
-            "detection_bboxes": [],
-            "detection_landmarks": [],
-            "tracking_bboxes": [],
-        }
+        self.recognition_cache.clear()
+        self.jobs.clear(self)
 
     def set_detection_zones(self, tlwhs):
         self.detection_zones = tlwhs
 
     def set_video_source(self, video_source: VideoSource = None):
-        self.cap = video_source
+        previous_source, self.cap = self.cap, video_source
+        if previous_source is not None and previous_source is not video_source:
+            previous_source.release()
 
     def get_video_source(self):
         return self.cap
@@ -100,14 +229,30 @@ class Recognizer:
     def get_recognized(self):
         return self.recognized_persons
 
+    def get_recognition_stats(self):
+        """Number of ArcFace calls made and saved by the recognition cache."""
+        return self.recognition_cache.stats()
+
+    def print_recognition_stats(self, name="Recognizer"):
+        """Print the ArcFace calls made and saved by the recognition cache."""
+        stats = self.get_recognition_stats()
+        print(f"{name}: {stats['embedded_calls']} recognition calls made, {stats['saved_calls']} saved by the cache")
+
     def is_hud_visible(self):
         return self.hud_visible
 
     def get_image(self):
         if self.tracking_image is None:
-            return np.ones((900, 1600, 3), np.uint8) * 255
+            if self.blank_image is None:
+                self.blank_image = np.ones((900, 1600, 3), np.uint8) * 255
+            return self.blank_image
         return self.tracking_image
 
+    def publish_image(self, image):
+        """Keep the processed frame and copy it into the frame ring read by the UI."""
+        self.tracking_image = image
+        self.frames.write(image)
+
     def set_hud_visible(self, visible):
         """Set HUD visibility."""
         self.hud_visible = visible
@@ -129,12 +274,59 @@ class Recognizer:
         Returns:
             numpy.ndarray: The processed tracking image.
         """
-        # Face detection and tracking
-        outputs, img_info, bboxes, landmarks = self.detector.detect_tracking(image=frame, tlwhs=self.detection_zones)
+        if not self.cadence.should_detect(frame_id):
+            return self.process_prediction(frame, frame_id, fps)
 
-        tracking_tlwhs = []
+        # Face detection and tracking, around the known tracks only between full-frame scans
+        rois = self.cadence.detection_zones(
+            frame_id, self.tracker.tracked_stracks + self.tracker.lost_stracks, frame.shape, self.detection_zones
+        )
+        if rois is None:
+            outputs, img_info, bboxes, landmarks = self.detector.detect_tracking(
+                image=frame, tlwhs=self.detection_zones
+            )
+        else:
+            roi_input_size = (self.cadence.roi_input_size, self.cadence.roi_input_size)
+            outputs, img_info, bboxes, landmarks = self.detector.detect_tracking(
+                image=frame, tlwhs=rois, input_size=roi_input_size
+            )
+
+        return self.process_detections(outputs, img_info, bboxes, landmarks, frame_id, fps)
+
+    def process_prediction(self, frame, frame_id, fps):
+        """
+        Move the tracks of a frame the detector skips to their Kalman-predicted position.
+
+        The recognition data keeps pointing to the last detected frame, only the boxes
+        shown by the HUD are updated.
+
+        Args:
+            frame: The input frame.
+            frame_id (int): The frame ID.
+            fps (float): Frames per second.
+
+        Returns:
+            numpy.ndarray: The processed tracking image.
+        """
+        self.publish_tracks(self.tracker.predict())
+        return frame
+
+    def process_detections(self, outputs, img_info, bboxes, landmarks, frame_id, fps):
+        """
+        Update the tracker with the detections of a frame.
+
+        Args:
+            outputs: The detections passed to the tracker.
+            img_info (dict): The frame information returned by the detector.
+            bboxes: The detection bounding boxes.
+            landmarks: The detection landmarks.
+            frame_id (int): The frame ID.
+            fps (float): Frames per second.
+
+        Returns:
+            numpy.ndarray: The processed tracking image.
+        """
         tracking_ids = []
-        tracking_scores = []
         tracking_bboxes = []
 
         tracking_image = img_info["raw_img"]
@@ -143,30 +335,15 @@ class Recognizer:
                 outputs, [img_info["height"], img_info["width"]], (img_info["height"], img_info["width"])
             )
 
-            for i in range(len(online_targets)):
-                t = online_targets[i]
-                tlwh = t.tlwh
-                tid = t.track_id
-                vertical = tlwh[2] / tlwh[3] > self.tracking_config["aspect_ratio_thresh"]
-                if tlwh[2] * tlwh[3] > self.tracking_config["min_box_area"] and not vertical:
-                    x1, y1, w, h = tlwh
-                    tracking_bboxes.append([x1, y1, x1 + w, y1 + h])
-                    tracking_tlwhs.append(tlwh)
-                    tracking_ids.append(tid)
-                    tracking_scores.append(t.score)
-
-            recs = []
-            for obj_id, tlwh in zip(tracking_ids, tracking_tlwhs):
-                obj_id = int(obj_id)
-
-                if name_score := self.id_face_mapping.get(obj_id):
-                    if name_score != 'UN_KNOWN':
-                        person = Person(*name_score.split(":"), tlwh=np.array(tlwh), is_unknown=False)
-                    else:
-                        person = Person(name="UN_KNOWN", score=0, tlwh=np.array(tlwh), is_unknown=True)
-                    recs.append(person)
-
-            self.recognized_persons = recs
+            # Forget the captions of the tracks the tracker gave up
+            removed_ids = [track.track_id for track in self.tracker.newly_removed_stracks]
+            self.recognition_cache.evict(removed_ids)
+            self.jobs.discard(self, removed_ids)
+            for track_id in removed_ids:
+                self.id_face_mapping.pop(track_id, None)
+
+            tracking_ids, tracking_bboxes = self.publish_tracks(online_targets)
+            self.cadence.schedule(frame_id, self.tracker.tracked_stracks)
 
             # if self.hud_visible:
             #     tracking_image = plot_tracking(
@@ -178,15 +355,51 @@ class Recognizer:
             #         fps=fps,
             #     )
 
-        self.data_mapping["raw_image"] = img_info["raw_img"]
-        self.data_mapping["detection_bboxes"] = bboxes
-        self.data_mapping["detection_landmarks"] = landmarks
-        self.data_mapping["tracking_ids"] = tracking_ids
-        self.data_mapping["tracking_bboxes"] = tracking_bboxes
+        snapshot = TrackingSnapshot.create(
+            frame_id, img_info["raw_img"], bboxes, landmarks, tracking_ids, tracking_bboxes
+        )
+
+        # Only the tracks that need an embedding reach the recognition workers
+        self.jobs.put(self.collect_recognition_jobs(snapshot))
 
         return tracking_image
 
-    @torch.no_grad()
+    def publish_tracks(self, online_targets):
+        """
+        Keep the face-shaped tracks and publish them with their captions for the HUD.
+
+        Args:
+            online_targets (list): The tracks returned by the tracker.
+
+        Returns:
+            tuple: The IDs and the (x_min, y_min, x_max, y_max) boxes of the kept tracks.
+        """
+        tracking_tlwhs = []
+        tracking_ids = []
+        tracking_bboxes = []
+        for t in online_targets:
+            tlwh = t.tlwh
+            vertical = tlwh[2] / tlwh[3] > self.tracking_config["aspect_ratio_thresh"]
+            if tlwh[2] * tlwh[3] > self.tracking_config["min_box_area"] and not vertical:
+                x1, y1, w, h = tlwh
+                tracking_bboxes.append([x1, y1, x1 + w, y1 + h])
+                tracking_tlwhs.append(tlwh)
+                tracking_ids.append(t.track_id)
+
+        recs = []
+        for obj_id, tlwh in zip(tracking_ids, tracking_tlwhs):
+            obj_id = int(obj_id)
+
+            if name_score := self.id_face_mapping.get(obj_id):
+                if name_score != 'UN_KNOWN':
+                    person = Person(*name_score.split(":"), tlwh=np.array(tlwh), is_unknown=False)
+                else:
+                    person = Person(name="UN_KNOWN", score=0, tlwh=np.array(tlwh), is_unknown=True)
+                recs.append(person)
+
+        self.recognized_persons = recs
+        return tracking_ids, tracking_bboxes
+
     def get_feature(self, face_image):
         """
         Extract features from a face image.
@@ -197,63 +410,95 @@ class Recognizer:
         Returns:
             numpy.ndarray: The extracted features.
         """
-        face_preprocess = transforms.Compose(
-            [
-                transforms.ToTensor(),
-                transforms.Resize((112, 112)),
-                transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5]),
-            ]
-        )
-
-        # Convert to RGB
-        face_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
+        return self.models.get_features([face_image])
 
-        # Preprocess image (BGR)
-        face_image = face_preprocess(face_image).unsqueeze(0).to(self.device)
+    def get_features(self, face_images):
+        """
+        Extract features from a batch of face images with a single forward pass.
 
-        # Inference to get feature
-        emb_img_face = self.recognizer(face_image).cpu().numpy()
+        Args:
+            face_images (list): The input face images (aligned 112x112 BGR crops).
 
-        # Convert to array
-        images_emb = emb_img_face / np.linalg.norm(emb_img_face)
+        Returns:
+            numpy.ndarray: The extracted features, one L2-normalized row per face.
+        """
+        return self.models.get_features(face_images)
 
-        return images_emb
+    def collect_recognition_jobs(self, snapshot):
+        """
+        Match the tracks of a tracking snapshot that need an embedding with their detection.
 
-    def recognize(self):
-        """Face recognition in a separate thread."""
-        while self.is_running:
-            raw_image = self.data_mapping["raw_image"]
-            detection_landmarks = self.data_mapping["detection_landmarks"]
-            detection_bboxes = self.data_mapping["detection_bboxes"]
-            tracking_ids = self.data_mapping["tracking_ids"]
-            tracking_bboxes = self.data_mapping["tracking_bboxes"]
+        Args:
+            snapshot (TrackingSnapshot): The snapshot to recognize.
 
+        Returns:
+            list: A RecognitionJob with the frame and landmarks of every matched track.
+        """
+        frame_id = snapshot.frame_id
+        raw_image = snapshot.raw_image
+        detection_landmarks = snapshot.detection_landmarks
+        detection_bboxes = snapshot.detection_bboxes
+        tracking_ids = snapshot.tracking_ids
+        tracking_bboxes = snapshot.tracking_bboxes
+
+        # Collect every matched track of this snapshot that needs an embedding
+        jobs = []
+        used_detections = set()
+        mapping_scores = self.mapping_bboxes(tracking_bboxes, detection_bboxes)
+        for i in range(len(tracking_bboxes)):
+            if not self.recognition_cache.should_embed(tracking_ids[i], frame_id, tracking_bboxes[i]):
+                continue
+            for j in np.flatnonzero(mapping_scores[i] > 0.9):
+                if j not in used_detections:
+                    jobs.append(
+                        RecognitionJob(
+                            tracking_ids[i], frame_id, tracking_bboxes[i], raw_image, detection_landmarks[j], owner=self
+                        )
+                    )
+                    used_detections.add(j)
+                    break
+
+        return jobs
+
+    def apply_recognitions(self, jobs, scores, names):
+        """Store the recognition results of the collected jobs."""
+        for job, score, name in zip(jobs, scores, names):
+            if name is None:
+                continue
+            if score < self.recognition_config["recognition_thresh"]:
+                caption = "UN_KNOWN"
+            else:
+                caption = f"{name}:{score:.2f}"
 
-            for i in range(len(tracking_bboxes)):
-                for j in range(len(detection_bboxes)):
-                    mapping_score = self.mapping_bbox(box1=tracking_bboxes[i], box2=detection_bboxes[j])
-                    if mapping_score > 0.9:
-                        face_alignment = norm_crop(img=raw_image, landmark=detection_landmarks[j])
+            self.id_face_mapping[job.track_id] = self.recognition_cache.update(
+                job.track_id, job.frame_id, job.bbox, score, caption
+            )
 
-                        score, name = self.recognition(face_image=face_alignment)
-                        if name is not None:
-                            if score < 0.25:
-                                caption = "UN_KNOWN"
-                            else:
-                                caption = f"{name}:{score:.2f}"
-                        else:
-                            continue
+    def recognize(self):
+        """Face recognition worker, one of `recognition_workers` threads draining the job queue."""
+        while self.is_running:
+            # The timeout only lets the loop see stop()
+            jobs = self.jobs.get_batch(self.recognition_batch_size, timeout=0.1)
+            if not jobs:
+                continue
 
-                        self.id_face_mapping[tracking_ids[i]] = caption
+            scores, names = self.recognition_batch(face_images=[job.face_image for job in jobs])
 
-                        detection_bboxes = np.delete(detection_bboxes, j, axis=0)
-                        detection_landmarks = np.delete(detection_landmarks, j, axis=0)
+            # Results of tracks removed in the meantime are dropped
+            kept = self.jobs.done(jobs)
+            self.apply_recognitions([jobs[i] for i in kept], scores[kept], names[kept])
 
-                        break
+    def recognition_batch(self, face_images):
+        """
+        Recognize a batch of face images.
 
-            if tracking_bboxes == []:
-                time.sleep(0.05)
+        Args:
+            face_images (list): The input face images.
 
+        Returns:
+            tuple: Arrays with the recognition score and name of every face.
+        """
+        return self.models.recognition_batch(face_images)
 
     def recognition(self, face_image):
         """
@@ -268,44 +513,22 @@ class Recognizer:
         # Get feature from face
         query_emb = self.get_feature(face_image)
 
-        score, id_min = compare_encodings(query_emb, self.images_embs)
-        name = self.images_names[id_min]
-        score = score[0]
+        scores, names, _ = self.gallery.search(query_emb, k=1)
 
-        return score, name
+        return scores[0, 0], names[0, 0]
 
-    def mapping_bbox(self, box1, box2):
+    def mapping_bboxes(self, boxes1, boxes2):
         """
-        Calculate the Intersection over Union (IoU) between two bounding boxes.
+        Calculate the Intersection over Union (IoU) between two sets of bounding boxes.
 
         Args:
-            box1 (tuple): The first bounding box (x_min, y_min, x_max, y_max).
-            box2 (tuple): The second bounding box (x_min, y_min, x_max, y_max).
+            boxes1: The first bounding boxes, N x 4 (x_min, y_min, x_max, y_max).
+            boxes2: The second bounding boxes, M x 4 (x_min, y_min, x_max, y_max), extra columns are ignored.
 
         Returns:
-            float: The IoU score.
+            numpy.ndarray: The N x M IoU scores, using inclusive pixel coordinates.
         """
-        # Calculate the intersection area
-        x_min_inter = max(box1[0], box2[0])
-        y_min_inter = max(box1[1], box2[1])
-        x_max_inter = min(box1[2], box2[2])
-        y_max_inter = min(box1[3], box2[3])
-
-        intersection_area = max(0, x_max_inter - x_min_inter + 1) * max(
-            0, y_max_inter - y_min_inter + 1
-        )
-
-        # Calculate the area of each bounding box
-        area_box1 = (box1[2] - box1[0] + 1) * (box1[3] - box1[1] + 1)
-        area_box2 = (box2[2] - box2[0] + 1) * (box2[3] - box2[1] + 1)
-
-        # Calculate the union area
-        union_area = area_box1 + area_box2 - intersection_area
-
-        # Calculate IoU
-        iou = intersection_area / union_area
-
-        return iou
+        return bbox_ious(boxes1, boxes2, pixel_offset=1)
 
     def tracking(self):
         """
@@ -323,11 +546,14 @@ class Recognizer:
             if self.cap is not None:
                 img = self.cap.get_frame()
                 if img is None:
-                    img = np.ones((900, 1600, 3), dtype=np.uint8) * 255
+                    # No new frame, the tracks, the frame ID and the detection cadence stay where they are
+                    time.sleep(0.01)
+                    continue
             else:
                 img = np.ones((900, 1600, 3), dtype=np.uint8) * 255
 
-            self.tracking_image = self.process_tracking(img, frame_id, fps)
+            self.publish_image(self.process_tracking(img, frame_id, fps))
+            frame_id += 1
 
             # Calculate and display the frame rate
             frame_count += 1
@@ -340,16 +566,25 @@ class Recognizer:
         self.is_running = True
         self.tracking_thread = threading.Thread(target=self.tracking)
         self.tracking_thread.start()
-        self.recognition_thread = threading.Thread(target=self.recognize)
-        self.recognition_thread.start()
+        self.recognition_threads = [
+            threading.Thread(target=self.recognize) for _ in range(self.recognition_workers)
+        ]
+        for thread in self.recognition_threads:
+            thread.start()
 
     def stop(self):
         if self.is_running:
             self.is_running = False
             if self.tracking_thread is not None:
                 self.tracking_thread.join()
-            if self.recognition_thread is not None:
-                self.recognition_thread.join()
+            self.jobs.wake_all()
+            for thread in self.recognition_threads:
+                thread.join()
+            self.print_recognition_stats()
+        if self.cap is not None:
+            self.cap.release()
+        if self.owns_models:
+            self.models.close()
 
     def __del__(self):
         self.stop()